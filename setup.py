@@ -4,7 +4,11 @@ from setuptools import setup, find_packages
 setup(
     name="beach_monitoring",
     version="0.1",
-    packages=find_packages(),
+    package_dir={'': 'src'},
+    # config has no __init__.py, so find_packages does not see it
+    packages=find_packages('src', exclude=['benchmarks']) + ['config'],
+    py_modules=['main', 'cli'],
+    package_data={'config': ['config.yaml']},
     install_requires=[
         'numpy',
         'opencv-python',
@@ -13,4 +17,7 @@ setup(
         'pandas',
         'PyYAML',
     ],
-)
\ No newline at end of file
+    entry_points={
+        'console_scripts': ['beach-monitor=cli:main'],
+    },
+)
@@ -0,0 +1,228 @@
+"""
+Benchmark harness for the detection, background, evaluation and rendering hot paths.
+
+Runs offline on CPU against the bundled Dataset frames and synthetic beach
+frames of configurable resolution, crowd density and frame count. Run from
+the src directory:
+
+    python -m benchmarks.runner --save-baseline benchmarks/baseline.json
+    python -m benchmarks.runner --baseline benchmarks/baseline.json --threshold 0.2
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from config.default_params import Config
+from detection.background import create_background_model
+from detection.people_detector import detect_and_count_people, process_beach_images
+from evaluation.ground_truth import GroundTruthStore
+from evaluation.metrics import evaluate_detections
+from utils.image_loader import load_images_from_folder
+from visualization.visualizer import save_results_with_presentation
+from .synthetic import make_synthetic_frames
+
+SUITES = ('background', 'detect', 'process', 'evaluate', 'render')
+
+def measure(func, repeats=3, warmup=1):
+    """
+    Time func() and record its peak traced allocation.
+    Returns the median and minimum wall time over `repeats` runs and the
+    peak memory (MiB) allocated through Python/NumPy during one run.
+    Progress output printed by the pipeline is suppressed.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return _measure(func, repeats, warmup)
+
+def _measure(func, repeats, warmup):
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'seconds': statistics.median(times),
+        'min_seconds': min(times),
+        'peak_mb': peak / (1024 * 1024),
+    }
+
+def parse_resolution(text):
+    """Parse WIDTHxHEIGHT."""
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+def _ground_truth_store(filenames, ground_truth):
+    names = list(filenames)
+    points = [ground_truth.get(name, np.empty((0, 2))) for name in names]
+    offsets = np.concatenate(([0], np.cumsum([len(p) for p in points])))
+    return GroundTruthStore(names, offsets, np.concatenate(points) if points else np.empty((0, 2)))
+
+def _workload_cases(args):
+    """Yield (label, params, frames, filenames, ground_truth) workloads."""
+    if not args.no_dataset and os.path.isdir(args.dataset):
+        with contextlib.redirect_stdout(io.StringIO()):
+            frames, filenames = load_images_from_folder(args.dataset)
+        if frames:
+            h, w = frames[0].shape[:2]
+            yield ('dataset', {'resolution': f'{w}x{h}', 'frames': len(frames)},
+                   frames, filenames, None)
+
+    for resolution in args.resolutions:
+        width, height = parse_resolution(resolution)
+        for n_frames in args.frames:
+            for density in args.densities:
+                frames, filenames, ground_truth = make_synthetic_frames(
+                    n_frames, width, height, density, seed=args.seed)
+                label = f'synthetic_{width}x{height}_{n_frames}f_{density}p'
+                params = {'resolution': f'{width}x{height}', 'frames': n_frames,
+                          'people_per_frame': density}
+                yield label, params, frames, filenames, ground_truth
+
+def run_benchmarks(args):
+    """Run the selected suites on every workload and return the results dictionary."""
+    cfg = Config()
+    results = {}
+
+    for label, params, frames, filenames, ground_truth in _workload_cases(args):
+        n_frames = len(frames)
+        print(f"\nWorkload {label}...")
+        background = create_background_model(frames, cfg.background)
+        with contextlib.redirect_stdout(io.StringIO()):
+            detections = process_beach_images(frames, background)
+        if ground_truth is None:
+            gt_source = str(cfg.ground_truth_file)
+        else:
+            gt_source = _ground_truth_store(filenames, ground_truth)
+
+        cases = {
+            'background': (lambda: create_background_model(frames, cfg.background), n_frames),
+            'detect': (lambda: [detect_and_count_people(frame, background) for frame in frames],
+                       n_frames),
+            'process': (lambda: process_beach_images(frames, background,
+                                                     workers=args.workers), n_frames),
+            'evaluate': (lambda: evaluate_detections(detections, gt_source, filenames),
+                         n_frames),
+        }
+        with contextlib.ExitStack() as scratch:
+            if 'render' in args.suites:
+                # Rendered figures are only timed, then removed with the folder
+                output_folder = scratch.enter_context(
+                    tempfile.TemporaryDirectory(prefix='beach_bench_'))
+                render_params = {'renderer': args.renderer, 'dpi': args.dpi,
+                                 'workers': args.workers}
+                cases['render'] = (lambda: save_results_with_presentation(
+                    output_folder, detections, frames, filenames, background, gt_source,
+                    params=render_params), n_frames)
+
+            for suite in args.suites:
+                func, units = cases[suite]
+                stats = measure(func, repeats=args.repeats, warmup=args.warmup)
+                stats['frames_per_second'] = (units / stats['seconds'] if stats['seconds'] > 0
+                                              else None)
+                stats.update(params)
+                results[f'{suite}/{label}'] = stats
+                print(f"  {suite}: {stats['seconds'] * 1000:.1f} ms, "
+                      f"{stats['frames_per_second']:.2f} frames/s, {stats['peak_mb']:.1f} MiB peak")
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+def compare_to_baseline(current, baseline, threshold):
+    """Return a list of (case, baseline_s, current_s) slower than baseline by more than threshold."""
+    regressions = []
+    for case, stats in current['results'].items():
+        reference = baseline.get('results', {}).get(case)
+        if reference is None:
+            continue
+        if stats['seconds'] > reference['seconds'] * (1 + threshold):
+            regressions.append((case, reference['seconds'], stats['seconds']))
+    return regressions
+
+def print_scaling(current):
+    """Print throughput and memory grouped by suite, i.e. the scaling curves."""
+    by_suite = {}
+    for case, stats in current['results'].items():
+        by_suite.setdefault(case.split('/')[0], []).append((case.split('/', 1)[1], stats))
+    for suite, rows in by_suite.items():
+        print(f"\n{suite}:")
+        print(f"  {'workload':<40} {'frames/s':>10} {'ms':>10} {'peak MiB':>10}")
+        for label, stats in rows:
+            print(f"  {label:<40} {stats['frames_per_second']:>10.2f} "
+                  f"{stats['seconds'] * 1000:>10.1f} {stats['peak_mb']:>10.1f}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--dataset', help='Folder of real frames (default: configured dataset)')
+    parser.add_argument('--no-dataset', action='store_true', help='Only use synthetic frames')
+    parser.add_argument('--resolutions', nargs='*', default=['960x540', '1920x1080'])
+    parser.add_argument('--frames', nargs='*', type=int, default=[5])
+    parser.add_argument('--densities', nargs='*', type=int, default=[50, 200],
+                        help='Synthetic people per frame')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--renderer', default='composite', choices=['composite', 'matplotlib'])
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results JSON here')
+    parser.add_argument('--baseline', help='Baseline JSON to compare against')
+    parser.add_argument('--save-baseline', help='Write results as a new baseline JSON')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed slowdown vs baseline before failing (0.2 = 20%%)')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.dataset is None:
+        args.dataset = str(Config().dataset_folder)
+    current = run_benchmarks(args)
+    print_scaling(current)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(current, f, indent=2)
+            print(f"\nResults saved to '{path}'")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(current, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions beyond {args.threshold:.0%}:")
+            for case, before, after in regressions:
+                print(f"  {case}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%} against '{args.baseline}'")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+
+def make_beach_scene(width, height, rng):
+    """Static beach background: sky, sea and textured sand bands."""
+    scene = np.empty((height, width, 3), dtype=np.uint8)
+    sky_end, sea_end = height // 4, height * 2 // 5
+
+    # Sky gradient, sea band and sand (BGR)
+    ramp = np.linspace(0, 1, sky_end, dtype=np.float32)[:, None, None]
+    scene[:sky_end] = (np.array([235, 200, 150]) * (1 - 0.3 * ramp)).astype(np.uint8)
+    scene[sky_end:sea_end] = (150, 110, 40)
+    scene[sea_end:] = (150, 185, 210)
+
+    # Low-frequency sand and water texture
+    noise = rng.normal(0, 6, (height // 8 + 1, width // 8 + 1)).astype(np.float32)
+    noise = cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+    textured = scene[sky_end:].astype(np.float32) + noise[sky_end:, :, None]
+    scene[sky_end:] = np.clip(textured, 0, 255).astype(np.uint8)
+    return scene
+
+def add_people(scene, n_people, rng):
+    """
+    Draw n_people dark blobs on the sand, larger nearer the camera.
+    Returns the frame and an (n_people, 2) array of (x, y) centers.
+    """
+    frame = scene.copy()
+    height, width = frame.shape[:2]
+    ys = rng.uniform(0.45 * height, 0.98 * height, n_people)
+    xs = rng.uniform(0.02 * width, 0.98 * width, n_people)
+    for x, y in zip(xs, ys):
+        # Perspective: blob size grows towards the bottom of the frame
+        size = (height / 1080) * (4 + 14 * (y / height - 0.45) / 0.55)
+        axes = (max(1, int(size * 0.5)), max(2, int(size)))
+        color = tuple(int(c) for c in rng.integers(10, 90, 3))
+        cv2.ellipse(frame, (int(x), int(y)), axes, 0, 0, 360, color, -1)
+    frame = cv2.GaussianBlur(frame, (3, 3), 0)
+    return frame, np.column_stack((xs, ys))
+
+def make_synthetic_frames(n_frames, width=1920, height=1080, people_per_frame=100, seed=0):
+    """
+    Generate a sequence of synthetic beach frames over one shared background.
+    Returns (frames, filenames, ground_truth) where ground_truth maps each
+    filename to its (N, 2) array of person centers.
+    """
+    rng = np.random.default_rng(seed)
+    scene = make_beach_scene(width, height, rng)
+    frames, filenames, ground_truth = [], [], {}
+    for i in range(n_frames):
+        frame, centers = add_people(scene, people_per_frame, rng)
+        filename = f'{1660114800 + 3600 * i}.jpg'
+        frames.append(frame)
+        filenames.append(filename)
+        ground_truth[filename] = centers
+    return frames, filenames, ground_truth
@@ -0,0 +1,200 @@
+"""
+Command line interface for the beach monitoring pipeline.
+
+Each stage can run on its own from what the previous stages saved in the
+output folder:
+
+    beach-monitor background   # background_model.png and the key it was built for
+    beach-monitor detect       # detections.npz: counts, detections and masks
+    beach-monitor evaluate     # evaluation.json and the time series
+    beach-monitor render       # presentation_visuals/ and detection_summary.txt
+    beach-monitor run          # the four stages in turn
+    beach-monitor stream       # count a camera feed (stream_params)
+    beach-monitor sweep        # tune detection_params (sweep_params)
+
+Modules are imported by the stages that use them, so `detect` starts without
+loading pandas or matplotlib. Without installing the package, run
+`python cli.py <command>` from the src directory.
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+BACKGROUND_FILE = 'background_model.png'
+BACKGROUND_KEY_FILE = 'background_model.key'  # Frames and parameters it was built from
+DETECTIONS_FILE = 'detections.npz'
+EVALUATION_FILE = 'evaluation.json'
+
+def load_config(args):
+    """Configuration from config.yaml (or --config), with paths overridden by options."""
+    from config.default_params import Config
+    cfg = Config(args.config, args.root, create_dirs=False)
+    for option, attribute in (('dataset', 'dataset_folder'), ('output', 'output_folder'),
+                              ('ground_truth', 'ground_truth_file')):
+        value = getattr(args, option)
+        if value:
+            setattr(cfg, attribute, Path(os.path.abspath(value)))
+    if args.profile:
+        cfg.profiling['enabled'] = True
+    return cfg
+
+def output_path(cfg, name):
+    return os.path.join(str(cfg.output_folder), name)
+
+def load_background(cfg):
+    """
+    The background saved by the background stage when it was built from the
+    current frames and parameters, otherwise rebuilt (through the background
+    cache) and saved again.
+    """
+    import cv2
+    from main import background_key
+    path = output_path(cfg, BACKGROUND_FILE)
+    key_path = output_path(cfg, BACKGROUND_KEY_FILE)
+    saved_key = None
+    if os.path.exists(key_path):
+        with open(key_path) as f:
+            saved_key = f.read().strip()
+    if saved_key == background_key(cfg):
+        background = cv2.imread(path) if os.path.exists(path) else None
+        if background is not None:
+            print(f"Loaded background model from '{path}'")
+            return background
+    elif os.path.exists(path):
+        print(f"Background model at '{path}' was not built from the current frames "
+              f"and parameters; rebuilding it")
+    return build_background(cfg)
+
+def build_background(cfg):
+    """Build the background model (or take it from the cache) and save it with its key."""
+    import cv2
+    from main import background_key, prepare_background
+    background, _, _ = prepare_background(cfg)
+    if background is not None:
+        os.makedirs(str(cfg.output_folder), exist_ok=True)
+        cv2.imwrite(output_path(cfg, BACKGROUND_FILE), background)
+        with open(output_path(cfg, BACKGROUND_KEY_FILE), 'w') as f:
+            f.write(background_key(cfg) + '\n')
+        print(f"Background model saved to '{output_path(cfg, BACKGROUND_FILE)}'")
+    return background
+
+def load_detections(cfg):
+    """Results and filenames saved by the detect stage, or None with a message."""
+    from detection.result import load_results
+    path = output_path(cfg, DETECTIONS_FILE)
+    if not os.path.exists(path):
+        print(f"No detections found at '{path}'; run the detect stage first.")
+        return None
+    return load_results(path)
+
+def background_command(cfg):
+    return 0 if build_background(cfg) is not None else 1
+
+def detect_command(cfg):
+    from detection.result import save_results
+    from main import detect_frames
+    background = load_background(cfg)
+    if background is None:
+        return 1
+    # Frames are streamed from the dataset folder and only compact results kept
+    results, filenames = detect_frames(cfg, background)
+    if not results:
+        print("No images found!")
+        return 1
+    os.makedirs(str(cfg.output_folder), exist_ok=True)
+    save_results(output_path(cfg, DETECTIONS_FILE), results, filenames)
+    print(f"\nCounted {sum(result.people_count for result in results)} people in "
+          f"{len(results)} frames; detections saved to '{output_path(cfg, DETECTIONS_FILE)}'")
+    return 0
+
+def evaluate_command(cfg):
+    from evaluation.ground_truth import load_ground_truth_store
+    from main import evaluate_results, open_result_store, print_evaluation
+    loaded = load_detections(cfg)
+    if loaded is None:
+        return 1
+    results, filenames = loaded
+    ground_truth = load_ground_truth_store(cfg.ground_truth_file)
+    store = open_result_store(cfg)
+    try:
+        evaluation_metrics = evaluate_results(cfg, results, filenames, ground_truth, store)
+    finally:
+        if store is not None:
+            store.close()
+    print_evaluation(evaluation_metrics)
+    with open(output_path(cfg, EVALUATION_FILE), 'w') as f:
+        json.dump(evaluation_metrics, f, indent=2, default=float)
+    print(f"\nEvaluation saved to '{output_path(cfg, EVALUATION_FILE)}'")
+    return 0
+
+def render_command(cfg):
+    from evaluation.ground_truth import load_ground_truth_store
+    from utils.image_loader import read_image
+    from visualization.visualizer import save_results_with_presentation
+    loaded = load_detections(cfg)
+    if loaded is None:
+        return 1
+    results, filenames = loaded
+    background = load_background(cfg)
+    if background is None:
+        return 1
+    reduction = cfg.get_loading_param('reduction') or 1
+    images = (read_image(os.path.join(str(cfg.dataset_folder), filename), reduction)
+              for filename in filenames)
+    print("\nSaving results...")
+    save_results_with_presentation(str(cfg.output_folder), results, images, filenames, background,
+                                   load_ground_truth_store(cfg.ground_truth_file),
+                                   params=cfg.visualization, reduction=reduction)
+    print(f"\nResults saved in '{cfg.output_folder}'")
+    return 0
+
+def run_command(cfg):
+    for command in (background_command, detect_command, evaluate_command, render_command):
+        status = command(cfg)
+        if status:
+            return status
+    return 0
+
+def stream_command(cfg):
+    from main import run_stream
+    run_stream(cfg)
+    return 0
+
+def sweep_command(cfg):
+    from main import run_parameter_sweep
+    run_parameter_sweep(cfg)
+    return 0
+
+COMMANDS = {
+    'background': (background_command, "Build the background model and save it"),
+    'detect': (detect_command, "Count people in every frame and save the detections"),
+    'evaluate': (evaluate_command, "Score saved detections against the ground truth"),
+    'render': (render_command, "Render presentation figures from saved detections"),
+    'run': (run_command, "Run background, detect, evaluate and render"),
+    'stream': (stream_command, "Count people continuously on a camera feed"),
+    'sweep': (sweep_command, "Search detection parameters on the dataset"),
+}
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='beach-monitor', description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text, description=help_text)
+        subparser.add_argument('--config', help="Configuration file (default: src/config/config.yaml)")
+        subparser.add_argument('--root', help="Directory the configured paths are relative to")
+        subparser.add_argument('--dataset', help="Image folder, overriding paths.dataset_folder")
+        subparser.add_argument('--output', help="Output folder, overriding paths.output_folder")
+        subparser.add_argument('--ground-truth', help="Labels CSV, overriding paths.ground_truth_file")
+        subparser.add_argument('--profile', action='store_true', help="Report stage timings")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    cfg = load_config(args)
+    from main import run_profiled
+    return run_profiled(cfg, COMMANDS[args.command][0])
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,29 +4,46 @@ import yaml
 from pathlib import Path
 
 class Config:
-    def __init__(self):
+    def __init__(self, config_path=None, project_root=None, create_dirs=True):
+        """
+        Load config.yaml, or the file at config_path. Paths in it are relative
+        to project_root (the repository root by default). With create_dirs
+        the output folder is created up front; otherwise it is left to the
+        stages that write to it.
+        """
         # Get the directory containing this script
         config_dir = Path(__file__).parent
-        config_path = config_dir / "config.yaml"
+        if config_path is None:
+            config_path = config_dir / "config.yaml"
         
         # Load configuration
         with open(config_path, 'r') as f:
             self.config = yaml.safe_load(f)
         
         # Set up paths relative to project root
-        project_root = config_dir.parent.parent
+        project_root = Path(project_root) if project_root is not None else config_dir.parent.parent
+        self.project_root = project_root
         self.dataset_folder = project_root / self.config['paths']['dataset_folder']
         self.output_folder = project_root / self.config['paths']['output_folder']
         self.ground_truth_file = project_root / self.config['paths']['ground_truth_file']
         
         # Create output directory if it doesn't exist
-        os.makedirs(self.output_folder, exist_ok=True)
+        if create_dirs:
+            os.makedirs(self.output_folder, exist_ok=True)
         
         # Other parameters
+        self.loading = self.config['loading_params']
         self.detection = self.config['detection_params']
         self.background = self.config['background_params']
         self.evaluation = self.config['evaluation_params']
         self.visualization = self.config['visualization_params']
+        self.profiling = self.config['profiling_params']
+        self.stream = self.config['stream_params']
+        self.sweep = self.config['sweep_params']
+    
+    def get_loading_param(self, *keys):
+        """Get nested image loading parameters"""
+        return self._get_nested_param(self.loading, keys)
     
     def get_detection_param(self, *keys):
         """Get nested detection parameters"""
@@ -44,6 +61,18 @@ class Config:
         """Get nested visualization parameters"""
         return self._get_nested_param(self.visualization, keys)
     
+    def get_profiling_param(self, *keys):
+        """Get nested profiling parameters"""
+        return self._get_nested_param(self.profiling, keys)
+    
+    def get_stream_param(self, *keys):
+        """Get nested camera-feed stream parameters"""
+        return self._get_nested_param(self.stream, keys)
+    
+    def get_sweep_param(self, *keys):
+        """Get nested parameter sweep parameters"""
+        return self._get_nested_param(self.sweep, keys)
+    
     def _get_nested_param(self, params, keys):
         """Helper method to get nested parameters"""
         for key in keys:
@@ -1,85 +1,377 @@
 import cv2
 import numpy as np
+from utils.profiling import timer, timed
+from .parallel import resolve_workers
+from .tiling import apply_tiled, map_tiles, tile_grid
+
+def _block_mode(channel_data, block_size=10, bins=50):
+    """
+    Approximate per-block mode of a (N, H, W) stack.
+    All block histograms are built in one vectorized bincount pass, using the
+    same per-block value range and bin edges as np.histogram.
+    """
+    n, h, w = channel_data.shape
+    rows = -(-h // block_size)
+    cols = -(-w // block_size)
+    pad_h = rows * block_size - h
+    pad_w = cols * block_size - w
+
+    # Pad partial edge blocks with NaN so they only count real pixels
+    data = channel_data.astype(np.float32, copy=False)
+    if pad_h or pad_w:
+        data = np.pad(data, ((0, 0), (0, pad_h), (0, pad_w)), constant_values=np.nan)
+
+    # (rows * cols, N * block_size * block_size) tiles, one row per block
+    tiles = data.reshape(n, rows, block_size, cols, block_size)
+    tiles = tiles.transpose(1, 3, 0, 2, 4).reshape(rows * cols, -1)
+
+    valid = None
+    if pad_h or pad_w:
+        valid = ~np.isnan(tiles)
+        low = np.nanmin(tiles, axis=1)
+        high = np.nanmax(tiles, axis=1)
+        tiles = np.where(valid, tiles, low[:, None])
+    else:
+        low = tiles.min(axis=1)
+        high = tiles.max(axis=1)
+
+    # np.histogram widens an empty range by 0.5 on each side
+    flat = low == high
+    low = np.where(flat, low - np.float32(0.5), low)[:, None]
+    high = np.where(flat, high + np.float32(0.5), high)[:, None]
+    span = high - low
+    step = span / np.float32(bins)
+
+    # Quantize every value in float32, mirroring np.histogram's uniform-bin path
+    indices = (((tiles - low) / span) * np.float32(bins)).astype(np.int32)
+    indices[indices == bins] -= 1
+
+    # Correct values within ~1 ULP of a bin edge; edge k is k * step + low
+    lower_edge = indices.astype(np.float32) * step + low
+    indices -= tiles < lower_edge
+    upper_edge = (indices + 1).astype(np.float32) * step + low
+    indices += (tiles >= upper_edge) & (indices != bins - 1)
+
+    # One bincount over all blocks, offset so each block owns `bins` slots
+    indices += (np.arange(rows * cols, dtype=np.int32) * bins)[:, None]
+    hist = np.bincount(indices.ravel(), weights=None if valid is None else valid.ravel(),
+                       minlength=rows * cols * bins)
+    mode_idx = np.argmax(hist.reshape(rows * cols, bins), axis=1)
+
+    # Bin centers from the same float32 edges (the last edge is exactly `high`)
+    left = mode_idx.astype(np.float32) * step[:, 0] + low[:, 0]
+    right = np.where(mode_idx + 1 == bins, high[:, 0],
+                     (mode_idx + 1).astype(np.float32) * step[:, 0] + low[:, 0])
+    mode_values = (left + right) / 2
+
+    # Expand block values back to pixel resolution
+    mode = np.repeat(np.repeat(mode_values.reshape(rows, cols), block_size, axis=0),
+                     block_size, axis=1)
+    return mode[:h, :w]
+
+REGIONS = ('sky', 'water')
+DEFAULT_REGION_STATISTICS = {
+    'sky': 'trimmed_mean',
+    'water': 'median',  # Median handles reflections better
+}
+
+def _region_bounds(h):
+    """Row ranges of the upper (sky) and lower (water) regions."""
+    split = int(h/3)  # Assume lower 2/3 might contain water
+    return {'sky': (0, split), 'water': (split, h)}
+
+def _stack_rows(images, start, stop, cols=None):
+    """Stack rows [start, stop) (and optionally columns) of every frame into a uint8 (N, rows, W, 3) array."""
+    cols = slice(None) if cols is None else slice(*cols)
+    if isinstance(images, np.ndarray):
+        return images[:, start:stop, cols]
+    return np.stack([img[start:stop, cols] for img in images])
+
+def _compute_statistics(stack, names, params=None):
+    """
+    Compute the requested per-pixel statistics of a (N, H, W, 3) uint8 stack.
+    Median and trimmed mean share a single partition along the frame axis;
+    the trimmed mean alone only needs the sum, minimum and maximum.
+    Returns a dictionary of float32 (H, W, 3) arrays.
+    """
+    n = len(stack)
+    stats = {}
+    if 'median' in names:
+        lower_mid, upper_mid = (n - 1) // 2, n // 2
+        partitioned = np.partition(stack, sorted({0, lower_mid, upper_mid, n - 1}), axis=0)
+        stats['median'] = (partitioned[lower_mid].astype(np.float32) + partitioned[upper_mid]) / 2
+        low, high = partitioned[0], partitioned[n - 1]
+    elif 'trimmed_mean' in names:
+        low, high = stack.min(axis=0), stack.max(axis=0)
+
+    if 'trimmed_mean' in names:
+        total = stack.sum(axis=0, dtype=np.float32)
+        if n > 2:
+            # Exclude highest and lowest values
+            stats['trimmed_mean'] = (total - low - high) / (n - 2)
+        else:
+            stats['trimmed_mean'] = total / n
+
+    if 'mode' in names:
+        mode_params = (params or {}).get('mode', {})
+        stats['mode'] = np.empty(stack.shape[1:], dtype=np.float32)
+        for channel in range(3):
+            stats['mode'][:,:,channel] = _block_mode(stack[..., channel],
+                                                     mode_params.get('block_size', 10),
+                                                     mode_params.get('bins', 50))
+    return stats
+
+def _tiling(params):
+    """
+    Tiling options from the background parameters, or None when disabled.
+    With `enabled: auto` tiles are used only when there is more than one
+    worker to spread them over, since on a single core they just add the
+    overlap.
+    """
+    tiling = (params or {}).get('tiling') or {}
+    enabled = tiling.get('enabled', 'auto')
+    if enabled == 'auto':
+        enabled = resolve_workers(tiling.get('workers', 0)) > 1
+    return tiling if enabled else None
+
+def _region_statistics(images, params=None):
+    """
+    Blend per-region statistics, computing each only over the rows that use it.
+    With tiling enabled each region is split into tiles and only one tile of
+    the frame stack is held per worker. The statistics are per pixel, and
+    per block for the mode, with tiles aligned to the blocks, so the result
+    is the same.
+    """
+    params = params or {}
+    region_statistics = {**DEFAULT_REGION_STATISTICS, **params.get('regions', {})}
+    tiling = _tiling(params)
+
+    h, w = images[0].shape[:2]
+    background = np.empty(images[0].shape, dtype=np.float32)
+    for region, (start, stop) in _region_bounds(h).items():
+        if start == stop:
+            continue
+        statistic = region_statistics[region]
+        if tiling is None:
+            stack = _stack_rows(images, start, stop)
+            background[start:stop] = _compute_statistics(stack, {statistic}, params)[statistic]
+            continue
+
+        def compute_tile(tile):
+            (top, bottom), cols = tile
+            stack = _stack_rows(images, start + top, start + bottom, cols)
+            background[start + top:start + bottom, cols[0]:cols[1]] = \
+                _compute_statistics(stack, {statistic}, params)[statistic]
+
+        block_size = params.get('mode', {}).get('block_size', 10)
+        map_tiles(compute_tile, tile_grid((stop - start, w), tiling.get('tile_size', 512),
+                                          align=block_size if statistic == 'mode' else 1),
+                  tiling.get('workers', 0))
+    return background
+
+def _filter_regions(filter_params):
+    """Regions a post-filter is enabled for (all regions by default)."""
+    return set(filter_params.get('regions', REGIONS))
+
+def _apply_to_regions(image, regions, margin, apply_filter):
+    """
+    Run `apply_filter` only over the enabled regions.
+    Each region is processed with `margin` extra rows of context so pixels
+    near the region boundary see the same neighbourhood as a full-frame pass.
+    """
+    if regions >= set(REGIONS):
+        return apply_filter(image)
+    result = image.copy()
+    h = image.shape[0]
+    for region, (start, stop) in _region_bounds(h).items():
+        if region not in regions or start == stop:
+            continue
+        top = max(0, start - margin)
+        bottom = min(h, stop + margin)
+        result[start:stop] = apply_filter(image[top:bottom])[start - top:stop - top]
+    return result
+
+def _tiled(apply_filter, margin, tiling):
+    """Run a neighbourhood filter tile by tile when tiling is enabled."""
+    if tiling is None:
+        return apply_filter
+    return lambda region: apply_tiled(region, apply_filter, tiling.get('tile_size', 512),
+                                      margin, tiling.get('workers', 0))
+
+def _finalize_background(background, params=None):
+    """
+    Apply edge-preserving smoothing, contrast enhancement and denoising.
+    With tiling enabled the bilateral filter and denoising run on tiles with
+    enough overlap to give the same result. CLAHE always sees the whole
+    frame, since its contrast tiles are fractions of the image size; it only
+    works on the luminance plane and is cheap.
+    """
+    params = params or {}
+    tiling = _tiling(params)
+    bilateral = params.get('bilateral_filter', {})
+    clahe_params = params.get('clahe', {})
+    denoising = params.get('denoising', {})
+    background = background.astype(np.uint8)
 
-def create_background_model(images):
-    """Create a robust background model using multiple techniques."""
-    if len(images) == 0:
-        return None
-    
-    # Convert images to float32 for better precision
-    float_images = [img.astype(np.float32) for img in images]
-    
-    # Create masks for different regions (water, sand, etc.)
-    h, w = float_images[0].shape[:2]
-    water_region = np.zeros((h, w), dtype=np.uint8)
-    water_region[int(h/3):] = 255  # Assume lower 2/3 might contain water
-    
-    # Initialize arrays for different statistical measures
-    median_model = np.zeros_like(float_images[0])
-    mean_model = np.zeros_like(float_images[0])
-    mode_model = np.zeros_like(float_images[0])
-    
-    # Process each color channel separately
-    for channel in range(3):
-        channel_data = np.array([img[:,:,channel] for img in float_images])
-        
-        # Median computation
-        median_model[:,:,channel] = np.median(channel_data, axis=0)
-        
-        # Mean with outlier removal
-        sorted_data = np.sort(channel_data, axis=0)
-        trimmed_mean = np.mean(sorted_data[1:-1], axis=0)  # Exclude highest and lowest values
-        mean_model[:,:,channel] = trimmed_mean
-        
-        # Approximate mode using histogram
-        for i in range(0, h, 10):  # Process in blocks for efficiency
-            for j in range(0, w, 10):
-                block = channel_data[:, i:min(i+10,h), j:min(j+10,w)]
-                hist, bins = np.histogram(block.ravel(), bins=50)
-                mode_idx = np.argmax(hist)
-                mode_value = (bins[mode_idx] + bins[mode_idx + 1]) / 2
-                mode_model[i:min(i+10,h), j:min(j+10,w), channel] = mode_value
-    
-    # Combine models based on region
-    background = np.zeros_like(float_images[0])
-    
-    # Use different techniques for different regions
-    for channel in range(3):
-        # Water regions: use median (handles reflections better)
-        background[:,:,channel] = np.where(
-            water_region == 255,
-            median_model[:,:,channel],
-            mean_model[:,:,channel]
-        )
-    
     # Apply bilateral filter to preserve edges while smoothing
-    background = cv2.bilateralFilter(
-        background.astype(np.uint8), 
-        9,  # Diameter of pixel neighborhood
-        75, # Sigma color
-        75  # Sigma space
-    )
-    
+    diameter = bilateral.get('diameter', 9)               # Diameter of pixel neighborhood
+    sigma_color = bilateral.get('sigma_color', 75)
+    sigma_space = bilateral.get('sigma_space', 75)
+    bilateral_margin = diameter // 2 if diameter > 0 else int(round(sigma_space * 1.5))
+    with timer('background', 'bilateral_filter'):
+        background = _apply_to_regions(
+            background, _filter_regions(bilateral), bilateral_margin,
+            _tiled(lambda region: cv2.bilateralFilter(region, diameter, sigma_color, sigma_space),
+                   bilateral_margin, tiling)
+        )
+
     # Enhance contrast in shadow areas
-    lab = cv2.cvtColor(background.astype(np.uint8), cv2.COLOR_BGR2LAB)
-    l, a, b = cv2.split(lab)
-    
-    # Apply CLAHE to luminance channel
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-    enhanced_l = clahe.apply(l)
-    
-    # Merge back
-    enhanced_lab = cv2.merge([enhanced_l, a, b])
-    enhanced_background = cv2.cvtColor(enhanced_lab, cv2.COLOR_LAB2BGR)
-    
+    clahe = cv2.createCLAHE(clipLimit=clahe_params.get('clip_limit', 2.0),
+                            tileGridSize=tuple(clahe_params.get('tile_grid_size', (8, 8))))
+
+    def enhance_contrast(region):
+        lab = cv2.cvtColor(region, cv2.COLOR_BGR2LAB)
+        l, a, b = cv2.split(lab)
+        # Apply CLAHE to luminance channel and merge back
+        enhanced_lab = cv2.merge([clahe.apply(l), a, b])
+        return cv2.cvtColor(enhanced_lab, cv2.COLOR_LAB2BGR)
+
+    with timer('background', 'clahe'):
+        background = _apply_to_regions(background, _filter_regions(clahe_params), 0,
+                                       enhance_contrast)
+
     # Final noise removal
-    final_background = cv2.fastNlMeansDenoisingColored(
-        enhanced_background,
-        None,
-        10, # Luminance component
-        10, # Color components
-        7,  # Template window size
-        21  # Search window size
-    )
-    
-    return final_background
\ No newline at end of file
+    template_window = denoising.get('template_window', 7)
+    search_window = denoising.get('search_window', 21)
+    denoising_margin = search_window // 2 + template_window // 2
+    with timer('background', 'denoising'):
+        background = _apply_to_regions(
+            background, _filter_regions(denoising), denoising_margin,
+            _tiled(lambda region: cv2.fastNlMeansDenoisingColored(
+                region,
+                None,
+                denoising.get('luminance', 10),    # Luminance component
+                denoising.get('color', 10),        # Color components
+                template_window,                   # Template window size
+                search_window                      # Search window size
+            ), denoising_margin, tiling)
+        )
+
+    return background
+
+@timed('create_background_model')
+def create_background_model(images, params=None):
+    """Create a robust background model using multiple techniques."""
+    if len(images) == 0:
+        return None
+
+    with timer('background', 'statistics'):
+        background = _region_statistics(images, params)
+    return _finalize_background(background, params)
+
+@timed('create_noise_model')
+def create_noise_model(images):
+    """
+    Per-pixel standard deviation of the grayscale frames, as a float32 image.
+    Frames are accumulated one at a time, so `images` may be a lazy stream.
+    Returns None when there are no frames.
+    """
+    total = total_squares = None
+    n = 0
+    for image in images:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if total is None:
+            total = np.zeros(gray.shape, dtype=np.float64)
+            total_squares = np.zeros(gray.shape, dtype=np.float64)
+        cv2.accumulate(gray, total)
+        cv2.accumulateSquare(gray, total_squares)
+        n += 1
+    if n == 0:
+        return None
+    mean = total / n
+    variance = np.maximum(total_squares / n - mean * mean, 0)
+    return np.sqrt(variance).astype(np.float32)
+
+class OnlineBackgroundModel:
+    """
+    Incremental background estimator with constant memory.
+
+    Frames are fed one at a time through update(). A fixed-size reservoir of
+    frames is kept, so memory does not grow with the number of frames seen.
+    Up to `reservoir_size` frames the statistics equal the batch model;
+    afterwards each new frame replaces a random slot with probability
+    max(reservoir_size / n, decay), so decay > 0 biases the reservoir towards
+    recent frames and lets the background follow tide and lighting changes.
+    With rolling=True the reservoir is instead a window of the most recent
+    frames, each new frame replacing the oldest.
+    """
+
+    def __init__(self, reservoir_size=16, decay=0.0, params=None, seed=None, rolling=False):
+        if reservoir_size < 1:
+            raise ValueError("reservoir_size must be at least 1")
+        if not 0.0 <= decay <= 1.0:
+            raise ValueError("decay must be between 0 and 1")
+        self.reservoir_size = reservoir_size
+        self.decay = decay
+        self.params = params
+        self.rolling = rolling
+        self.frames_seen = 0
+        self._rng = np.random.default_rng(seed)
+        self._reservoir = None
+        self._filled = 0
+
+    def update(self, frame):
+        """Add a BGR frame to the estimator."""
+        if self._reservoir is None:
+            self._reservoir = np.empty((self.reservoir_size,) + frame.shape, dtype=np.uint8)
+        elif frame.shape != self._reservoir.shape[1:]:
+            raise ValueError(f"Frame shape {frame.shape} does not match model shape "
+                             f"{self._reservoir.shape[1:]}")
+
+        self.frames_seen += 1
+        if self._filled < self.reservoir_size:
+            self._reservoir[self._filled] = frame
+            self._filled += 1
+            return
+
+        if self.rolling:
+            # Overwrite the oldest frame of the window
+            self._reservoir[(self.frames_seen - 1) % self.reservoir_size] = frame
+            return
+
+        # Reservoir sampling, optionally biased towards recent frames
+        keep_probability = max(self.reservoir_size / self.frames_seen, self.decay)
+        if self._rng.random() < keep_probability:
+            self._reservoir[self._rng.integers(self.reservoir_size)] = frame
+
+    def _samples(self):
+        if self._filled == 0:
+            raise ValueError("No frames have been added to the background model")
+        return self._reservoir[:self._filled]
+
+    def _statistic(self, name):
+        return _compute_statistics(self._samples(), {name}, self.params)[name]
+
+    def median(self):
+        """Approximate per-pixel median as a float32 image."""
+        return self._statistic('median')
+
+    def trimmed_mean(self):
+        """Approximate per-pixel mean excluding the extreme samples."""
+        return self._statistic('trimmed_mean')
+
+    def mode(self):
+        """Approximate block-wise histogram mode."""
+        return self._statistic('mode')
+
+    def model(self):
+        """Return the current background, processed like create_background_model."""
+        if self._filled == 0:
+            return None
+        return create_background_model(self._samples(), self.params)
+
+    def noise(self):
+        """Per-pixel standard deviation of the current samples, as create_noise_model."""
+        if self._filled == 0:
+            return None
+        return create_noise_model(self._samples())
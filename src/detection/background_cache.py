@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+
+CACHE_SUFFIX = '.bg.npz'
+# Bump when the background algorithm changes so old models are not reused
+CACHE_VERSION = 1
+
+def frame_signature(image_paths):
+    """(name, size, mtime_ns) of every input frame, in path order."""
+    signature = []
+    for image_path in image_paths:
+        stat = os.stat(image_path)
+        signature.append((os.path.basename(image_path), stat.st_size, stat.st_mtime_ns))
+    return signature
+
+def background_cache_key(image_paths, params=None, **extra):
+    """
+    Hash of the input frame list (names, sizes, mtimes), the background
+    parameters and any extra settings that change the model, such as the
+    decode reduction.
+    """
+    params = {key: value for key, value in (params or {}).items()
+              if key not in ('cache', 'tiling')}
+    payload = json.dumps({
+        'version': CACHE_VERSION,
+        'frames': frame_signature(image_paths),
+        'params': params,
+        'extra': extra,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+class BackgroundCache:
+    """
+    Background models stored on disk as <key>.bg.npz, with JSON metadata.
+
+    Several cameras or datasets can share one cache folder; when more than
+    `max_entries` models are stored the least recently used ones are removed.
+    Use is tracked through each file's modification time, refreshed on
+    every hit.
+    """
+
+    def __init__(self, folder, max_entries=8):
+        self.folder = str(folder)
+        self.max_entries = max_entries
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + CACHE_SUFFIX)
+
+    def get(self, key):
+        """Return the cached background for a key, or None."""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                background = data['background']
+        except (OSError, KeyError, ValueError):
+            return None  # Missing or unreadable entry: rebuild it
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return background
+
+    def put(self, key, background, **metadata):
+        """Store a background model and evict the least recently used entries."""
+        os.makedirs(self.folder, exist_ok=True)
+        metadata = {**metadata, 'key': key, 'created': time.time(),
+                    'shape': list(background.shape)}
+        path = self._path(key)
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, background=background,
+                            metadata=np.array(json.dumps(metadata, default=str)))
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def metadata(self, key):
+        """Metadata stored with a cached model, or None."""
+        try:
+            with np.load(self._path(key)) as data:
+                return json.loads(str(data['metadata']))
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def entries(self):
+        """Cached keys, most recently used first."""
+        if not os.path.isdir(self.folder):
+            return []
+        paths = [os.path.join(self.folder, name) for name in os.listdir(self.folder)
+                 if name.endswith(CACHE_SUFFIX)]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        return [os.path.basename(path)[:-len(CACHE_SUFFIX)] for path in paths]
+
+    def evict(self):
+        """Remove the least recently used entries beyond max_entries."""
+        for key in self.entries()[self.max_entries:]:
+            self.invalidate(key)
+
+    def invalidate(self, key=None):
+        """Remove one cached model, or every model when key is None."""
+        keys = self.entries() if key is None else [key]
+        for cached_key in keys:
+            try:
+                os.remove(self._path(cached_key))
+            except FileNotFoundError:
+                pass
+
+def cached_background_model(cache, key, build, **metadata):
+    """Return the cached background for `key`, building and storing it on a miss."""
+    background = cache.get(key)
+    if background is not None:
+        print(f"Loaded cached background model {key}")
+        return background
+    background = build()
+    if background is not None:
+        try:
+            cache.put(key, background, **metadata)
+        except OSError as e:
+            print(f"Could not cache background model: {e}")
+    return background
@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+from scipy.spatial import cKDTree
+
+# One record per detection: full-resolution box (x, y, w, h), contour
+# centroid (x, y), the pyramid scale it was found at and its contour area
+DETECTION_DTYPE = np.dtype([
+    ('box', np.int32, (4,)),
+    ('centroid', np.float64, (2,)),
+    ('scale', np.float32),
+    ('area', np.float64),
+])
+
+OVERLAP_METRICS = ('iou', 'ios')
+
+def contour_boxes(contours):
+    """Return an (N, 4) int array of contour bounding boxes (x, y, w, h)."""
+    boxes = np.empty((len(contours), 4), dtype=np.int32)
+    for i, contour in enumerate(contours):
+        boxes[i] = cv2.boundingRect(contour)
+    return boxes
+
+def box_overlap(boxes_a, boxes_b, metric='iou'):
+    """
+    Element-wise overlap of two (N, 4) box arrays: intersection over union,
+    or with 'ios' intersection over the smaller box, which also catches a
+    small box found inside a larger one at another scale.
+    """
+    x1 = np.maximum(boxes_a[:, 0], boxes_b[:, 0])
+    y1 = np.maximum(boxes_a[:, 1], boxes_b[:, 1])
+    x2 = np.minimum(boxes_a[:, 0] + boxes_a[:, 2], boxes_b[:, 0] + boxes_b[:, 2])
+    y2 = np.minimum(boxes_a[:, 1] + boxes_a[:, 3], boxes_b[:, 1] + boxes_b[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = boxes_a[:, 2] * boxes_a[:, 3]
+    area_b = boxes_b[:, 2] * boxes_b[:, 3]
+    if metric == 'ios':
+        denominator = np.minimum(area_a, area_b)
+    else:
+        denominator = area_a + area_b - intersection
+    return intersection / np.maximum(denominator, 1)
+
+def overlapping_pairs(boxes):
+    """
+    All (i, j) pairs, i < j, whose boxes may overlap. Box centers are indexed
+    in a KD-tree and queried with the largest possible center distance of two
+    overlapping boxes, so crowded frames stay near-linear.
+    """
+    if len(boxes) < 2:
+        return np.empty((0, 2), dtype=np.intp)
+    boxes = boxes.astype(np.float64)
+    centers = boxes[:, :2] + boxes[:, 2:] / 2
+    radius = np.hypot(boxes[:, 2], boxes[:, 3]).max()
+    return cKDTree(centers).query_pairs(radius, output_type='ndarray')
+
+def suppress_duplicates(boxes, scales, areas, overlap=0.5, metric='iou', cross_scale_only=True):
+    """
+    Greedy non-maximum suppression of the same person found at several scales.
+
+    Detections are ranked by scale (finest outline first), then by area, and
+    each kept detection suppresses lower-ranked ones whose boxes overlap it by
+    more than `overlap`. With cross_scale_only, detections from the same
+    scale never suppress each other: they come from separate blobs.
+    Returns the indices of the kept detections in their original order.
+    """
+    n = len(boxes)
+    if n < 2:
+        return np.arange(n)
+    boxes = np.asarray(boxes)
+    scales = np.asarray(scales)
+    pairs = overlapping_pairs(boxes)
+    if cross_scale_only and len(pairs):
+        pairs = pairs[scales[pairs[:, 0]] != scales[pairs[:, 1]]]
+    if len(pairs):
+        pairs = pairs[box_overlap(boxes[pairs[:, 0]], boxes[pairs[:, 1]], metric) > overlap]
+    if not len(pairs):
+        return np.arange(n)
+
+    # Rank detections and point every pair from the higher to the lower rank
+    order = np.lexsort((-np.asarray(areas), -scales))
+    rank = np.empty(n, dtype=np.intp)
+    rank[order] = np.arange(n)
+    swap = rank[pairs[:, 0]] > rank[pairs[:, 1]]
+    pairs[swap] = pairs[swap][:, ::-1]
+
+    # Neighbour lists of lower-ranked overlapping detections
+    pairs = pairs[np.argsort(pairs[:, 0], kind='stable')]
+    starts = np.searchsorted(pairs[:, 0], np.arange(n + 1))
+
+    suppressed = np.zeros(n, dtype=bool)
+    for i in order:
+        if not suppressed[i]:
+            suppressed[pairs[starts[i]:starts[i + 1], 1]] = True
+    return np.flatnonzero(~suppressed)
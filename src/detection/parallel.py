@@ -0,0 +1,104 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+import numpy as np
+
+# Per-process state installed once by the pool initializer
+_worker_state = {}
+
+def resolve_workers(workers):
+    """Return the worker count, using all cores when workers is None or <= 0."""
+    if workers is None or workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+def _init_worker(func, shm_name, shape, dtype, func_kwargs):
+    """Attach to the shared array and remember the per-frame function."""
+    shared = None
+    if shm_name is not None:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_state['shm'] = shm  # Keep the mapping alive for the worker's lifetime
+        shared = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker_state['func'] = func
+    _worker_state['shared'] = shared
+    _worker_state['kwargs'] = func_kwargs
+
+def _run_in_worker(index, frame):
+    """Apply the installed function to one frame inside a worker."""
+    state = _worker_state
+    return index, state['func'](frame, state['shared'], **state['kwargs'])
+
+def imap_frames(func, frames, shared=None, workers=None, backend='thread',
+                ordered=True, func_kwargs=None):
+    """
+    Apply func(frame, shared, **func_kwargs) to every frame in parallel.
+
+    Yields (index, result) pairs, in input order when `ordered` is True and
+    as soon as each frame finishes otherwise. `shared` (e.g. the background
+    model) is handed to each worker once: thread workers reference it directly
+    and process workers map it from shared memory instead of receiving a
+    pickled copy per task. At most 2 * workers frames are in flight, so
+    `frames` may be a lazy iterator.
+    """
+    workers = resolve_workers(workers)
+    func_kwargs = func_kwargs or {}
+
+    if workers == 1:
+        for index, frame in enumerate(frames):
+            yield index, func(frame, shared, **func_kwargs)
+        return
+
+    shm = None
+    if backend == 'process':
+        shm_name = shape = dtype = None
+        if shared is not None:
+            shm = shared_memory.SharedMemory(create=True, size=max(shared.nbytes, 1))
+            np.ndarray(shared.shape, dtype=shared.dtype, buffer=shm.buf)[...] = shared
+            shm_name, shape, dtype = shm.name, shared.shape, shared.dtype
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(func, shm_name, shape, dtype, func_kwargs)
+        )
+        submit = lambda index, frame: executor.submit(_run_in_worker, index, frame)
+    elif backend == 'thread':
+        # OpenCV releases the GIL, so threads share the background without copies
+        executor = ThreadPoolExecutor(max_workers=workers)
+        submit = lambda index, frame: executor.submit(
+            lambda: (index, func(frame, shared, **func_kwargs)))
+    else:
+        raise ValueError(f"Unknown parallel backend: {backend}")
+
+    max_pending = 2 * workers
+    frame_iter = enumerate(frames)
+    pending = set()
+    finished = {}
+    next_index = 0
+    exhausted = False
+    try:
+        with executor:
+            while True:
+                # Keep the pool busy without reading the whole input ahead
+                while not exhausted and len(pending) + len(finished) < max_pending:
+                    item = next(frame_iter, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    pending.add(submit(*item))
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, result = future.result()
+                    if ordered:
+                        finished[index] = result
+                    else:
+                        yield index, result
+                while next_index in finished:
+                    yield next_index, finished.pop(next_index)
+                    next_index += 1
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
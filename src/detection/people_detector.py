@@ -1,130 +1,433 @@
 from .background import create_background_model
+from .parallel import imap_frames
+from .merge import DETECTION_DTYPE, contour_boxes, suppress_duplicates
+from .preprocess import get_preprocessor
+from .result import DetectionResult
+from .result_store import frame_hash, detector_version
+from .settings import DEFAULT_SETTINGS
+from .tiling import map_tiles, tile_bounds
+from utils.profiling import timer, timed, count
 import cv2
 import numpy as np
-def detect_and_count_people(image, background=None):
-    """Detect and count people with multi-scale detection for varying distances."""
-    
-    # Convert to grayscale
-    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # Background subtraction if available
-    if background is not None:
-        gray_background = cv2.cvtColor(background, cv2.COLOR_BGR2GRAY)
-        diff = cv2.absdiff(gray_background, gray_image)
-        _, motion_mask = cv2.threshold(diff, 30, 255, cv2.THRESH_BINARY)
-    else:
-        motion_mask = np.ones_like(gray_image) * 255
-    
-    # Multi-scale detection
-    scales = [1.0, 0.75, 0.5]  # Multiple scales for different distances
-    all_contours = []
-    image_height, image_width = gray_image.shape
-    
-    for scale in scales:
-        # Resize image for different scales
-        if scale != 1.0:
-            width = int(gray_image.shape[1] * scale)
-            height = int(gray_image.shape[0] * scale)
-            scaled_image = cv2.resize(gray_image, (width, height))
-            scaled_mask = cv2.resize(motion_mask, (width, height))
+
+def contour_centroids(contours):
+    """Return an (N, 2) float array of contour centroids in (x, y) order."""
+    centroids = np.empty((len(contours), 2), dtype=np.float64)
+    for i, contour in enumerate(contours):
+        m = cv2.moments(contour)
+        if m['m00'] > 0:
+            centroids[i] = (m['m10'] / m['m00'], m['m01'] / m['m00'])
         else:
-            scaled_image = gray_image.copy()
-            scaled_mask = motion_mask.copy()
-        
-        # Apply Gaussian blur
-        blurred = cv2.GaussianBlur(scaled_image, (5, 5), 0)
-        
-        # Separate processing for upper (distant) and lower (near) regions
-        h, w = scaled_image.shape
-        upper_region = blurred[0:int(h/2), :]
-        lower_region = blurred[int(h/2):, :]
-        
-        # Different thresholding parameters for different regions
-        upper_thresh = cv2.adaptiveThreshold(
-            upper_region, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY_INV, 21, 4)  # More sensitive for distant objects
+            # Degenerate contour: fall back to the bounding box center
+            x, y, w, h = cv2.boundingRect(contour)
+            centroids[i] = (x + w / 2, y + h / 2)
+    return centroids
+
+def contour_rows(contours):
+    """Return the first and last row of every contour as two int arrays."""
+    if not contours:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    lengths = [len(contour) for contour in contours]
+    rows = np.concatenate(contours)[:, 0, 1]
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return np.minimum.reduceat(rows, offsets), np.maximum.reduceat(rows, offsets)
+
+def _level_mask(blurred, scaled_mask, level, settings, rows):
+    """Threshold and clean up rows (start, stop) of one scale level."""
+    start, stop = rows
+    scale = level.scale
+    with timer('detect', scale, 'adaptive_threshold'):
+        # Separate processing for upper (distant) and lower (near) regions;
+        # the split stays at the middle of the whole level when cropping
+        h, w = blurred.shape
+        split = min(max(int(h/2), start), stop)
+        thresh = np.empty((stop - start, w), dtype=np.uint8)
         
-        lower_thresh = cv2.adaptiveThreshold(
-            lower_region, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY_INV, 31, 8)  # Less sensitive for near objects
+        # Different thresholding parameters for different regions,
+        # written straight into the two halves of one mask
+        if split > start:
+            cv2.adaptiveThreshold(
+                blurred[start:split, :], 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                cv2.THRESH_BINARY_INV, *settings.distant_threshold,
+                dst=thresh[0:split - start, :])  # More sensitive for distant objects
         
-        thresh = np.vstack((upper_thresh, lower_thresh))
+        if stop > split:
+            cv2.adaptiveThreshold(
+                blurred[split:stop, :], 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                cv2.THRESH_BINARY_INV, *settings.near_threshold,
+                dst=thresh[split - start:, :])  # Less sensitive for near objects
         
         # Combine with motion mask
-        combined_mask = cv2.bitwise_and(thresh, scaled_mask)
-        
-        # Scale-dependent morphological operations
-        kernel_size = max(2, int(3 * scale))
-        kernel_open = np.ones((kernel_size, kernel_size), np.uint8)
-        kernel_close = np.ones((kernel_size + 2, kernel_size + 2), np.uint8)
-        
-        # Remove noise and connect components
-        processed = cv2.morphologyEx(combined_mask, cv2.MORPH_OPEN, kernel_open)
-        processed = cv2.morphologyEx(processed, cv2.MORPH_CLOSE, kernel_close)
-        
-        # Find contours
-        contours, _ = cv2.findContours(processed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Scale-specific size filtering
-        min_size = int(100 * scale * scale)  # Smaller min size for distant objects
-        max_size = int(3000 * scale * scale)
-        
-        # Filter contours
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if min_size <= area <= max_size:
-                x, y, w, h = cv2.boundingRect(contour)
-                aspect_ratio = h / float(w)
-                
-                # Ignore contours in the top 40% of the image
-                bounding_box_center_y = (y + y + h) // 2  # Calculate bounding box center y-coordinate
-                if bounding_box_center_y < 0.4 * image_height:
-                    continue
-                
-                # More lenient aspect ratio for distant objects
-                if y < h / 2:  # Upper half of image
-                    aspect_ratio_range = (0.2, 4.0)
-                    solidity_threshold = 0.2
-                else:  # Lower half of image
-                    aspect_ratio_range = (0.3, 3.0)
-                    solidity_threshold = 0.3
+        combined_mask = cv2.bitwise_and(thresh, scaled_mask[start:stop, :], dst=thresh)
+    
+    with timer('detect', scale, 'morphology'):
+        # Remove noise and connect components with the scale's precomputed kernels
+        processed = cv2.morphologyEx(combined_mask, cv2.MORPH_OPEN, level.kernel_open)
+        processed = cv2.morphologyEx(processed, cv2.MORPH_CLOSE, level.kernel_close)
+    return processed
+
+def _find_contours(processed, start):
+    """Contour engine: external contours in level coordinates, with their row extents."""
+    contours, _ = cv2.findContours(processed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                   offset=(0, start))
+    return contours, contour_rows(contours)
+
+def _filter_contours(contours, level, settings, image_shape, roi_mask, owned_rows=None):
+    """
+    Contour engine: shape filters applied contour by contour.
+    With `owned_rows` (first, last), only contours whose bounding box center
+    lies in those level rows are kept.
+    """
+    roi = settings.roi
+    scale = level.scale
+    image_height = image_shape[0]
+    kept = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if level.min_size <= area <= level.max_size:
+            x, y, w, h = cv2.boundingRect(contour)
+            aspect_ratio = h / float(w)
+            
+            # Ignore contours in the top 40% of the image
+            bounding_box_center_y = (y + y + h) // 2  # Calculate bounding box center y-coordinate
+            if bounding_box_center_y < roi.min_center_y * image_height:
+                continue
+            if owned_rows is not None and not owned_rows[0] <= bounding_box_center_y <= owned_rows[1]:
+                continue
+            
+            # Ignore contours centered outside the ROI polygons, bands or mask
+            if roi_mask is not None and not roi.contains(
+                    image_shape, (x + w / 2) / scale, (y + h / 2) / scale):
+                continue
+            
+            # More lenient aspect ratio for distant objects
+            if y < h / 2:  # Upper half of image
+                aspect_ratio_range = settings.distant_aspect_ratio
+                solidity_threshold = settings.distant_solidity
+            else:  # Lower half of image
+                aspect_ratio_range = settings.near_aspect_ratio
+                solidity_threshold = settings.near_solidity
+            
+            if aspect_ratio_range[0] <= aspect_ratio <= aspect_ratio_range[1]:
+                # Additional shape analysis
+                hull = cv2.convexHull(contour)
+                hull_area = cv2.contourArea(hull)
+                solidity = float(area) / hull_area if hull_area > 0 else 0
                 
-                if aspect_ratio_range[0] <= aspect_ratio <= aspect_ratio_range[1]:
-                    # Additional shape analysis
-                    hull = cv2.convexHull(contour)
-                    hull_area = cv2.contourArea(hull)
-                    solidity = float(area) / hull_area if hull_area > 0 else 0
-                    
-                    if solidity > solidity_threshold:
-                        # Scale contour back to original size
-                        if scale != 1.0:
-                            contour = (contour / scale).astype(np.int32)
-                        all_contours.append(contour)
+                if solidity > solidity_threshold:
+                    # Scale contour back to original size
+                    if scale != 1.0:
+                        contour = (contour / scale).astype(np.int32)
+                    kept.append(contour)
+    return kept
+
+def _find_components(processed, start):
+    """Component engine: labels and stats of 8-connected blobs, with their row extents."""
+    try:
+        # 16-bit labels halve the memory traffic; OpenCV raises if they overflow
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(processed, connectivity=8,
+                                                               ltype=cv2.CV_16U)
+    except cv2.error:
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(processed, connectivity=8)
+    stats = stats[1:]  # Drop the background label
+    tops = stats[:, cv2.CC_STAT_TOP] + start
+    bottoms = tops + stats[:, cv2.CC_STAT_HEIGHT] - 1
+    return (labels, stats, start), (tops, bottoms)
+
+def _filter_components(components, level, settings, image_shape, roi_mask, owned_rows=None):
+    """
+    Component engine: the aspect and position filters, plus a bound on the
+    contour area from the bounding box, run as array masks over all blobs,
+    including the `owned_rows` test of the contour engine.
+    Contours are only traced for the survivors, which then get the exact
+    area and solidity tests. A component's bounding box equals its outer
+    contour's, so results match the contour engine except for blobs lying
+    inside another blob's hole, which the contour engine never sees.
+    """
+    labels, stats, start = components
+    roi = settings.roi
+    scale = level.scale
+    x = stats[:, cv2.CC_STAT_LEFT]
+    y = stats[:, cv2.CC_STAT_TOP] + start
+    w = stats[:, cv2.CC_STAT_WIDTH]
+    h = stats[:, cv2.CC_STAT_HEIGHT]
+
+    # The contour runs through pixel centers, so its area is at most (w-1)(h-1)
+    keep = (w - 1) * (h - 1) >= level.min_size
+    # Ignore blobs in the top 40% of the image
+    keep &= (y + y + h) // 2 >= roi.min_center_y * image_shape[0]
+    if owned_rows is not None:
+        keep &= ((y + y + h) // 2 >= owned_rows[0]) & ((y + y + h) // 2 <= owned_rows[1])
+    if roi_mask is not None:
+        keep &= roi.contains(image_shape, (x + w / 2) / scale, (y + h / 2) / scale)
+
+    # More lenient aspect ratio and solidity for distant objects
+    distant = y < h / 2
+    aspect_ratio = h / w.astype(np.float64)
+    low = np.where(distant, settings.distant_aspect_ratio[0], settings.near_aspect_ratio[0])
+    high = np.where(distant, settings.distant_aspect_ratio[1], settings.near_aspect_ratio[1])
+    solidity_threshold = np.where(distant, settings.distant_solidity, settings.near_solidity)
+    keep &= (low <= aspect_ratio) & (aspect_ratio <= high)
+
+    kept = []
+    for i in np.flatnonzero(keep):
+        # Trace the survivor's outline from its label inside its bounding box
+        top = y[i] - start
+        blob = (labels[top:top + h[i], x[i]:x[i] + w[i]] == i + 1).view(np.uint8)
+        contours, _ = cv2.findContours(blob, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                       offset=(int(x[i]), int(y[i])))
+        contour = contours[0]
+        area = cv2.contourArea(contour)
+        if not level.min_size <= area <= level.max_size:
+            continue
+        hull_area = cv2.contourArea(cv2.convexHull(contour))
+        solidity = float(area) / hull_area if hull_area > 0 else 0
+        if solidity > solidity_threshold[i]:
+            # Scale contour back to original size
+            if scale != 1.0:
+                contour = (contour / scale).astype(np.int32)
+            kept.append(contour)
+    return kept
+
+# Candidate extraction and filtering for each filter engine
+FILTER_ENGINES = {
+    'contours': (_find_contours, _filter_contours),
+    'components': (_find_components, _filter_components),
+}
+
+def _detect_in_rows(blurred, scaled_mask, level, settings, center_rows, image_shape,
+                    roi_mask, owned_rows=None, crop=None):
+    """
+    Candidates of one scale level whose bounding box centers can lie in
+    `center_rows`, filtered; with `owned_rows`, only those centered there.
+    """
+    roi = settings.roi
+    find_candidates, filter_candidates = FILTER_ENGINES[settings.filter_engine]
+    level_height = blurred.shape[0]
+
+    # Only process the rows that can hold a kept blob, widening the
+    # crop while a blob at its edge could reach into them
+    rows = roi.window(center_rows, level_height, crop)
+    if not cv2.countNonZero(scaled_mask[rows[0]:rows[1], :]):
+        # No foreground in the window, so thresholding can only give an empty mask
+        count('foreground_free_windows')
+        return []
+    while rows is not None:
+        processed = _level_mask(blurred, scaled_mask, level, settings, rows)
+        with timer('detect', level.scale, 'find_contours'):
+            candidates, (tops, bottoms) = find_candidates(processed, rows[0])
+        rows = roi.widen_window(tops, bottoms, rows, center_rows, level_height)
+        if rows is not None:
+            count('roi_retries')
+    count('candidate_contours', len(tops))
+
+    # Filter candidates
+    with timer('detect', level.scale, 'filter_contours'):
+        return filter_candidates(candidates, level, settings, image_shape, roi_mask, owned_rows)
+
+@timed('detect_and_count_people')
+def detect_and_count_people(image, background=None, return_centroids=False, preprocessor=None,
+                            settings=None, return_detections=False, prepared=None, noise=None):
+    """
+    Detect and count people with multi-scale detection for varying distances.
+    Returns (count, mask), followed by centroids when return_centroids is set
+    and by a DETECTION_DTYPE array (box, centroid, scale, area) when
+    return_detections is set. The mask has the frame's resolution; centroids
+    and detections are in full-resolution pixels (see DetectorSettings.reduction).
+    A FramePreprocessor built for `background` may be passed in; otherwise a
+    cached one is used, so the grayscale background is computed only once.
+    `noise` is the background's noise model (create_noise_model), used for
+    per-pixel motion thresholds when settings.preprocess sets a noise_factor.
+    A PreparedFrame of the image may be passed as `prepared` to skip
+    preprocessing altogether, e.g. when many settings are tried on one frame;
+    its pyramid must match settings.scales.
+    `settings` is a compiled DetectorSettings; the defaults are the values
+    in DEFAULT_DETECTION_PARAMS.
+    """
+    if settings is None:
+        settings = DEFAULT_SETTINGS
+    if preprocessor is None and prepared is None:
+        preprocessor = get_preprocessor(background, noise, **settings.preprocess)
+    roi = settings.roi
+    tiling = settings.tiling
     
-    # Create final mask
-    mask = np.zeros_like(gray_image)
-    cv2.drawContours(mask, all_contours, -1, 255, thickness=cv2.FILLED)
+    # Grayscale conversion, background subtraction and the blurred multi-scale pyramid
+    if prepared is None:
+        with timer('detect', 'preprocess'):
+            prepared = preprocessor.prepare(image)
+    
+    # Multi-scale detection
+    all_contours = []
+    all_scales = []
+    image_height, image_width = prepared.gray.shape
+    roi_mask = roi.mask((image_height, image_width))
+    if not prepared.levels:
+        count('foreground_free_frames')
+    
+    for level, (scale, blurred, scaled_mask) in zip(settings.levels, prepared.levels):
+        level_height = blurred.shape[0]
+        center_rows = roi.center_rows((image_height, image_width), scale, level_height)
+        if center_rows is None:
+            continue
+        
+        if tiling['enabled']:
+            # Full-width bands of center rows, each processed over its own
+            # cropped window and keeping only the blobs centered in it, so a
+            # blob crossing a seam is found exactly once, as in the whole level
+            first, last = center_rows
+            bands = [(first + start, first + stop - 1) for start, stop in
+                     tile_bounds(last - first + 1, max(1, int(tiling['tile_size'] * scale)))]
+            count('detection_tiles', len(bands))
+            kept = [contour
+                    for band_contours in map_tiles(
+                        lambda band: _detect_in_rows(blurred, scaled_mask, level, settings, band,
+                                                     (image_height, image_width), roi_mask,
+                                                     owned_rows=band, crop=True),
+                        bands, tiling['workers'])
+                    for contour in band_contours]
+        else:
+            kept = _detect_in_rows(blurred, scaled_mask, level, settings, center_rows,
+                                   (image_height, image_width), roi_mask)
+        all_contours.extend(kept)
+        all_scales.extend([scale] * len(kept))
     
-    # Final cleanup
-    kernel_final = np.ones((5, 5), np.uint8)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel_final)
+    with timer('detect', 'merge'):
+        # The same person is often found at several scales: keep one detection
+        boxes = contour_boxes(all_contours)
+        scales = np.asarray(all_scales, dtype=np.float32)
+        areas = np.array([cv2.contourArea(contour) for contour in all_contours])
+        if settings.merge['enabled']:
+            keep = suppress_duplicates(boxes, scales, areas, settings.merge['overlap'],
+                                       settings.merge['metric'],
+                                       settings.merge['cross_scale_only'])
+            count('merged_duplicates', len(all_contours) - len(keep))
+            all_contours = [all_contours[i] for i in keep]
+            boxes, scales, areas = boxes[keep], scales[keep], areas[keep]
     
-    return len(all_contours), mask
+    with timer('detect', 'final_mask'):
+        # Create final mask from the kept detections
+        mask = np.zeros((image_height, image_width), dtype=np.uint8)
+        cv2.drawContours(mask, all_contours, -1, 255, thickness=cv2.FILLED)
+        
+        # Final cleanup
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, settings.kernel_final)
+
+    output = (len(all_contours), mask)
+    if return_centroids or return_detections:
+        # The mask stays at frame resolution; coordinates and areas are
+        # reported in full-resolution pixels when frames were decoded reduced
+        reduction = settings.reduction
+        centroids = contour_centroids(all_contours) * reduction
+        if return_centroids:
+            output += (centroids,)
+        if return_detections:
+            detections = np.empty(len(all_contours), dtype=DETECTION_DTYPE)
+            detections['box'] = boxes * reduction
+            detections['centroid'] = centroids
+            detections['scale'] = scales
+            detections['area'] = areas * reduction ** 2
+            output += (detections,)
+    return output
+
+def _detect_frame(image, background, settings=None, noise=None):
+    """Per-frame task for the parallel engine, returning a compact DetectionResult."""
+    people_count, mask, detections = detect_and_count_people(
+        image, background, settings=settings, return_detections=True, noise=noise)
+    # Encoded in the worker, so only the compact result crosses process boundaries
+    return DetectionResult.from_mask(people_count, mask, detections)
 
-def process_beach_images(images, background=None):
-    """Process multiple beach images to detect and count people."""
+def imap_detect_people(images, background, workers=None, backend='thread', ordered=False,
+                       settings=None, noise=None):
+    """
+    Detect people in many frames in parallel, yielding results as frames finish.
+    Each result is a DetectionResult, as returned by process_beach_images.
+    `settings` is the DetectorSettings compiled once for every frame and
+    `noise` the background's noise model, if any.
+    """
+    for i, result in imap_frames(
+            _detect_frame, images, background, workers=workers, backend=backend,
+            ordered=ordered, func_kwargs={'settings': settings, 'noise': noise}):
+        result.image_index = i
+        yield result
+
+def process_beach_images(images, background=None, workers=1, backend='thread', settings=None,
+                         store=None, filenames=None, noise=None):
+    """
+    Process multiple beach images to detect and count people.
+    Returns a DetectionResult per frame; masks are held run-length encoded,
+    so memory stays small over long series of frames.
+    With a ResultStore, frames whose content, detector settings and background
+    are unchanged are served from the store and only the rest are detected;
+    every new result is stored. `filenames` are recorded alongside.
+    `noise` is the background's noise model, for per-pixel motion thresholds.
+    """
+    return list(iter_beach_images(images, background, workers, backend, settings, store,
+                                  filenames, noise))
+
+def iter_beach_images(images, background=None, workers=1, backend='thread', settings=None,
+                      store=None, filenames=None, noise=None):
+    """
+    Generator form of process_beach_images, taking the same arguments.
+    Each frame's DetectionResult is yielded in input order as soon as it and
+    every earlier frame are done, so results can be rendered or evaluated
+    while later frames are still being detected. `filenames` may be a list
+    that grows as `images` is read.
+    """
     if background is None:
-        return []
+        return
 
-    results = []
+    # Images may be a list or a lazy stream of frames
+    total = f"/{len(images)}" if hasattr(images, '__len__') else ""
     print("\nProcessing individual frames...")
-    for i, image in enumerate(images):
-        print(f"Processing image {i+1}/{len(images)}...")
-        count, mask = detect_and_count_people(image, background)
-        results.append({
-            'image_index': i,
-            'people_count': count,
-            'detection_mask': mask
-        })
-
-    return results
\ No newline at end of file
+
+    def named(result, i):
+        if filenames is not None and i < len(filenames):
+            result.filename = filenames[i]
+        return result
+
+    # Identifies what counted each frame, with or without a result store
+    version = detector_version(settings or DEFAULT_SETTINGS, background, noise)
+    if store is None:
+        for result in imap_detect_people(images, background, workers, backend, ordered=True,
+                                         settings=settings, noise=noise):
+            print(f"Processed image {result.image_index+1}{total}...")
+            count('frames')
+            result.version = version
+            yield named(result, result.image_index)
+        return
+
+    finished = {}  # Results waiting for an earlier frame to finish
+    missing = []  # (index, frame hash) of frames sent to the detector
+    next_index = 0
+
+    def uncached_frames():
+        for i, image in enumerate(images):
+            key = frame_hash(image)
+            cached = store.get(key, version)
+            if cached is None:
+                missing.append((i, key))
+                yield image
+            else:
+                cached.image_index = i
+                finished[i] = named(cached, i)
+                print(f"Loaded image {i+1}{total} from the result store")
+                count('cached_frames')
+
+    def ready():
+        nonlocal next_index
+        while next_index in finished:
+            yield finished.pop(next_index)
+            next_index += 1
+
+    for result in imap_detect_people(uncached_frames(), background, workers, backend,
+                                     ordered=True, settings=settings, noise=noise):
+        i, key = missing[result.image_index]
+        result.image_index, result.frame_hash, result.version = i, key, version
+        named(result, i)
+        store.put(key, version, result, filename=result.filename)
+        print(f"Processed image {i+1}{total}...")
+        count('frames')
+        finished[i] = result
+        yield from ready()
+    yield from ready()
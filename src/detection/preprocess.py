@@ -0,0 +1,157 @@
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+DEFAULT_SCALES = (1.0, 0.75, 0.5)
+PYRAMID_METHODS = ('pyrdown', 'resize')
+
+class PreparedFrame:
+    """Grayscale frame, motion mask and blurred pyramid levels for one image."""
+    __slots__ = ('gray', 'motion_mask', 'levels')
+
+    def __init__(self, gray, motion_mask, levels):
+        self.gray = gray
+        self.motion_mask = motion_mask
+        # [(scale, blurred_image, scaled_mask)] in the requested order; empty
+        # when the motion mask has no foreground, as nothing can be detected
+        self.levels = levels
+
+    def detach(self):
+        """Copy of the frame that no longer uses the preprocessor's reusable buffers."""
+        copies = {}
+
+        def copy(array):
+            if id(array) not in copies:
+                copies[id(array)] = array.copy()
+            return copies[id(array)]
+
+        return PreparedFrame(copy(self.gray), copy(self.motion_mask),
+                             [(scale, copy(blurred), copy(mask))
+                              for scale, blurred, mask in self.levels])
+
+class FramePreprocessor:
+    """
+    Shared preprocessing stage for detect_and_count_people.
+
+    The grayscale background is computed once per background model. Each
+    frame's levels are resized from full resolution by default; with
+    pyramid='pyrdown' a level whose double already exists is made with pyrDown
+    from it instead (0.5 from 1.0), which is cheaper but slightly smoother
+    than cv2.resize and so can shift counts a little. Output buffers are reused
+    across frames of the same shape; they are kept per thread so one
+    preprocessor can be shared by thread-pool workers. The arrays in a
+    PreparedFrame are therefore only valid until the same thread prepares
+    its next frame.
+
+    A pixel is foreground where it differs from the background by more than
+    `motion_threshold`. Given the per-pixel standard deviation of the
+    background (`noise`, from create_noise_model) and a `noise_factor` k, the
+    threshold is max(motion_threshold, k * noise) per pixel instead. Glare
+    and waves then need a larger difference than still sand, in one
+    comparison per frame against a threshold map built once here. Frames
+    without foreground skip the pyramid altogether.
+    """
+
+    def __init__(self, background=None, scales=DEFAULT_SCALES, motion_threshold=30,
+                 blur_kernel=5, pyramid='resize', noise=None, noise_factor=0):
+        if pyramid not in PYRAMID_METHODS:
+            raise ValueError(f"Unknown pyramid method: {pyramid}")
+        self.background = background
+        self.gray_background = (cv2.cvtColor(background, cv2.COLOR_BGR2GRAY)
+                                if background is not None else None)
+        self.scales = tuple(scales)
+        self.motion_threshold = motion_threshold
+        self.blur_kernel = (blur_kernel, blur_kernel)
+        self.pyramid = pyramid
+        self.noise = noise
+        self.threshold_map = None
+        if noise is not None and noise_factor and self.gray_background is not None:
+            if noise.shape != self.gray_background.shape:
+                raise ValueError(f"Noise model shape {noise.shape} does not match background "
+                                 f"shape {self.gray_background.shape}")
+            # Differences are integers, so `diff > t` is `diff > floor(t)`
+            thresholds = np.maximum(noise_factor * noise, motion_threshold)
+            self.threshold_map = np.floor(np.minimum(thresholds, 255)).astype(np.uint8)
+        self._local = threading.local()
+
+    def _buffer(self, name, shape):
+        """Return a reusable uint8 buffer for this thread."""
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buffer = buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = buffers[name] = np.empty(shape, dtype=np.uint8)
+        return buffer
+
+    def _scaled_size(self, shape, scale):
+        return int(shape[1] * scale), int(shape[0] * scale)
+
+    def prepare(self, image):
+        """Convert, background-subtract, scale and blur one BGR frame."""
+        shape = image.shape[:2]
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self._buffer('gray', shape))
+
+        # Background subtraction if available
+        motion_mask = self._buffer('motion', shape)
+        if self.gray_background is not None:
+            cv2.absdiff(self.gray_background, gray, dst=motion_mask)
+            if self.threshold_map is not None:
+                cv2.compare(motion_mask, self.threshold_map, cv2.CMP_GT, dst=motion_mask)
+            else:
+                cv2.threshold(motion_mask, self.motion_threshold, 255, cv2.THRESH_BINARY,
+                              dst=motion_mask)
+            if not cv2.countNonZero(motion_mask):
+                return PreparedFrame(gray, motion_mask, [])
+        else:
+            motion_mask.fill(255)
+
+        # Build the pyramid from the largest scale down
+        built = {}
+        for scale in sorted(set(self.scales), reverse=True):
+            if scale == 1.0:
+                built[scale] = (gray, motion_mask)
+                continue
+            width, height = self._scaled_size(shape, scale)
+            scaled_image = self._buffer(('image', scale), (height, width))
+            scaled_mask = self._buffer(('mask', scale), (height, width))
+            source = built.get(scale * 2) if self.pyramid == 'pyrdown' else None
+            if source is not None:
+                cv2.pyrDown(source[0], dst=scaled_image, dstsize=(width, height))
+                cv2.pyrDown(source[1], dst=scaled_mask, dstsize=(width, height))
+            else:
+                cv2.resize(gray, (width, height), dst=scaled_image)
+                cv2.resize(motion_mask, (width, height), dst=scaled_mask)
+            built[scale] = (scaled_image, scaled_mask)
+
+        levels = []
+        for scale in self.scales:
+            scaled_image, scaled_mask = built[scale]
+            # Apply Gaussian blur
+            blurred = cv2.GaussianBlur(scaled_image, self.blur_kernel, 0,
+                                       dst=self._buffer(('blurred', scale), scaled_image.shape))
+            levels.append((scale, blurred, scaled_mask))
+        return PreparedFrame(gray, motion_mask, levels)
+
+# Preprocessors for recently used background models; holding a reference to
+# each background and noise model keeps its id() from being reused while it is cached
+_preprocessor_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_CACHE_SIZE = 4
+
+def get_preprocessor(background, noise=None, **options):
+    """Return a cached FramePreprocessor for a background model, its noise model and options."""
+    key = (id(background), id(noise), tuple(sorted((k, tuple(v) if isinstance(v, list) else v)
+                                        for k, v in options.items())))
+    with _cache_lock:
+        preprocessor = _preprocessor_cache.get(key)
+        if (preprocessor is not None and preprocessor.background is background
+                and preprocessor.noise is noise):
+            _preprocessor_cache.move_to_end(key)
+            return preprocessor
+        preprocessor = FramePreprocessor(background, noise=noise, **options)
+        _preprocessor_cache[key] = preprocessor
+        while len(_preprocessor_cache) > _CACHE_SIZE:
+            _preprocessor_cache.popitem(last=False)
+        return preprocessor
@@ -0,0 +1,128 @@
+import os
+import zlib
+import numpy as np
+from .merge import DETECTION_DTYPE
+
+def encode_mask(mask):
+    """
+    Run-length encode a binary mask: alternating run lengths of zero and
+    non-zero pixels in row-major order, starting with zeros, as zlib-compressed
+    uint32 values.
+    """
+    flat = mask.ravel() != 0
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    bounds = np.concatenate(([0], changes, [flat.size]))
+    runs = np.diff(bounds)
+    if flat.size and flat[0]:
+        runs = np.concatenate(([0], runs))
+    return zlib.compress(runs.astype(np.uint32).tobytes())
+
+def decode_mask(data, shape, value=255):
+    """Inverse of encode_mask, giving a uint8 mask with `value` for set pixels."""
+    runs = np.frombuffer(zlib.decompress(data), dtype=np.uint32)
+    values = np.zeros(len(runs), dtype=np.uint8)
+    values[1::2] = value
+    return np.repeat(values, runs).reshape(shape)
+
+class DetectionResult:
+    """
+    Detections for one frame, kept compact for long runs.
+
+    The detection mask is held run-length encoded (typically a few kB instead
+    of a full-resolution uint8 image) and decoded on each access of
+    `detection_mask`, so callers should keep the decoded array only as long
+    as they need it. Detections are DETECTION_DTYPE records; `centroids` and
+    `boxes` are views of them.
+    """
+
+    __slots__ = ('image_index', 'people_count', 'detections', 'shape', 'mask_rle',
+                 'filename', 'frame_hash', 'version', 'cached', 'background_updated')
+
+    def __init__(self, people_count, detections, shape, mask_rle, image_index=None,
+                 filename=None, frame_hash=None, version=None, cached=False,
+                 background_updated=False):
+        self.image_index = image_index
+        self.people_count = int(people_count)
+        self.detections = detections
+        self.shape = tuple(shape)
+        self.mask_rle = mask_rle
+        self.filename = filename
+        self.frame_hash = frame_hash
+        self.version = version
+        self.cached = cached
+        self.background_updated = background_updated
+
+    @classmethod
+    def from_mask(cls, people_count, mask, detections=None, **fields):
+        """Build a result from a dense detection mask."""
+        if detections is None:
+            detections = np.empty(0, dtype=DETECTION_DTYPE)
+        return cls(people_count, detections, mask.shape, encode_mask(mask), **fields)
+
+    @property
+    def detection_mask(self):
+        """The uint8 detection mask (255 where people were detected), decoded on access."""
+        return decode_mask(self.mask_rle, self.shape)
+
+    @property
+    def centroids(self):
+        """(N, 2) array of detection centroids (x, y)."""
+        return self.detections['centroid']
+
+    @property
+    def boxes(self):
+        """(N, 4) array of detection boxes (x, y, w, h)."""
+        return self.detections['box']
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the result's arrays."""
+        return len(self.mask_rle) + self.detections.nbytes
+
+    def __repr__(self):
+        return (f"DetectionResult(image_index={self.image_index}, "
+                f"people_count={self.people_count}, shape={self.shape})")
+
+def save_results(path, results, filenames):
+    """
+    Write results and their filenames to an .npz file: counts and shapes as
+    arrays, encoded masks and detection records concatenated with offsets.
+    """
+    masks = [result.mask_rle for result in results]
+    detections = [result.detections for result in results]
+    tmp_path = str(path) + '.tmp.npz'
+    np.savez(tmp_path,
+             filenames=np.array(list(filenames), dtype=str),
+             people_count=np.array([result.people_count for result in results], dtype=np.int64),
+             shape=np.array([result.shape for result in results], dtype=np.int64).reshape(-1, 2),
+             mask_offsets=np.cumsum([0] + [len(mask) for mask in masks]),
+             masks=np.frombuffer(b''.join(masks), dtype=np.uint8),
+             detection_offsets=np.cumsum([0] + [len(records) for records in detections]),
+             detections=(np.concatenate(detections) if detections
+                         else np.empty(0, dtype=DETECTION_DTYPE)),
+             frame_hash=np.array([result.frame_hash or '' for result in results], dtype=str),
+             version=np.array([result.version or '' for result in results], dtype=str))
+    # Replace in one step so readers never see a partial file
+    os.replace(tmp_path, path)
+
+def load_results(path):
+    """Read results written by save_results; returns (results, filenames)."""
+    with np.load(path) as data:
+        # Every lookup reads the array from the file again, so read each once
+        arrays = {key: data[key] for key in data.files}
+    filenames = [str(name) for name in arrays['filenames']]
+    masks = arrays['masks'].tobytes()
+    mask_offsets = arrays['mask_offsets']
+    detection_offsets = arrays['detection_offsets']
+    results = []
+    for i, filename in enumerate(filenames):
+        results.append(DetectionResult(
+            arrays['people_count'][i],
+            arrays['detections'][detection_offsets[i]:detection_offsets[i + 1]].copy(),
+            arrays['shape'][i],
+            masks[mask_offsets[i]:mask_offsets[i + 1]],
+            image_index=i,
+            filename=filename,
+            frame_hash=str(arrays['frame_hash'][i]) or None,
+            version=str(arrays['version'][i]) or None))
+    return results, filenames
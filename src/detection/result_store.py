@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+from .merge import DETECTION_DTYPE
+from .result import DetectionResult
+
+# Bump when the detector code or the schema changes so old entries are dropped
+RESULT_STORE_VERSION = 2
+
+def frame_hash(image):
+    """Content hash of a decoded frame (pixels and shape)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(image.shape).encode('ascii'))
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+def detector_version(settings, background, noise=None):
+    """Identify a detector configuration, background model and noise model combination."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{RESULT_STORE_VERSION}:{settings.version}".encode('ascii'))
+    if background is not None:
+        digest.update(np.ascontiguousarray(background).data)
+    if noise is not None and settings.preprocess.get('noise_factor'):
+        digest.update(np.ascontiguousarray(noise).data)
+    return digest.hexdigest()
+
+def evaluation_key(ground_truth_points, max_distance, matching):
+    """Identify the ground truth and matching settings a frame was scored with."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(ground_truth_points, dtype=np.float64).data)
+    digest.update(f"{max_distance}:{matching}".encode('ascii'))
+    return digest.hexdigest()
+
+class ResultStore:
+    """
+    SQLite store of per-frame detection results and evaluation metrics.
+
+    Results are keyed by frame content hash and detector version (settings
+    plus background model), so a frame is only detected again when its
+    pixels, the detector settings or the background change. Masks are kept
+    run-length encoded; counts and detection records as arrays. Metrics
+    are also keyed by the ground truth points and matching settings, so
+    evaluation only scores frames whose results or labels changed.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(self.path)
+        stored_version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if stored_version != RESULT_STORE_VERSION:
+            # Written by another version of the detector or schema: start over
+            self._connection.executescript("""
+                DROP TABLE IF EXISTS results;
+                DROP TABLE IF EXISTS metrics;
+            """)
+            self._connection.execute(f"PRAGMA user_version = {RESULT_STORE_VERSION}")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                frame_hash TEXT NOT NULL,
+                version TEXT NOT NULL,
+                filename TEXT,
+                people_count INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                width INTEGER NOT NULL,
+                mask_rle BLOB NOT NULL,
+                detections BLOB NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (frame_hash, version)
+            );
+            CREATE TABLE IF NOT EXISTS metrics (
+                frame_hash TEXT NOT NULL,
+                version TEXT NOT NULL,
+                evaluation_key TEXT NOT NULL,
+                metrics TEXT NOT NULL,
+                PRIMARY KEY (frame_hash, version, evaluation_key)
+            );
+        """)
+
+    def get(self, frame_hash, version):
+        """Return a stored DetectionResult, or None."""
+        row = self._connection.execute(
+            "SELECT people_count, height, width, mask_rle, detections "
+            "FROM results WHERE frame_hash = ? AND version = ?",
+            (frame_hash, version)).fetchone()
+        if row is None:
+            return None
+        people_count, height, width, mask_rle, detections = row
+        return DetectionResult(people_count, np.frombuffer(detections, dtype=DETECTION_DTYPE).copy(),
+                               (height, width), mask_rle, frame_hash=frame_hash,
+                               version=version, cached=True)
+
+    def put(self, frame_hash, version, result, filename=None):
+        """Store a DetectionResult; its mask is kept in its encoded form."""
+        self._connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (frame_hash, version, filename, result.people_count,
+             result.shape[0], result.shape[1], result.mask_rle,
+             np.ascontiguousarray(result.detections, dtype=DETECTION_DTYPE).tobytes(),
+             time.time()))
+        self._connection.commit()
+
+    def get_metrics(self, frame_hash, version, key):
+        """Return stored per-frame metrics, or None."""
+        row = self._connection.execute(
+            "SELECT metrics FROM metrics WHERE frame_hash = ? AND version = ? "
+            "AND evaluation_key = ?", (frame_hash, version, key)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put_metrics(self, frame_hash, version, key, metrics):
+        """Store per-frame metrics."""
+        self._connection.execute(
+            "INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?)",
+            (frame_hash, version, key, json.dumps(metrics)))
+        self._connection.commit()
+
+    def invalidate(self, version=None):
+        """Drop the results and metrics of one detector version, or everything."""
+        with self._connection:
+            for table in ('results', 'metrics'):
+                if version is None:
+                    self._connection.execute(f"DELETE FROM {table}")
+                else:
+                    self._connection.execute(f"DELETE FROM {table} WHERE version = ?",
+                                             (version,))
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
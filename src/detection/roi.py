@@ -0,0 +1,161 @@
+import math
+import cv2
+import numpy as np
+
+class RegionOfInterest:
+    """
+    Region of the frame in which people are counted.
+
+    A contour is kept when the center of its bounding box passes both tests:
+      * min_center_y, the original rule: the center row, in the coordinates of
+        the scale level it was found at, must not lie above this fraction of
+        the full frame height.
+      * the ROI mask, built from row bands and polygons (fractions of the frame
+        size, combined as a union) and intersected with an optional mask image
+        whose non-zero pixels are inside. With no bands, polygons or mask
+        image the whole frame is inside.
+
+    With crop enabled each scale level is thresholded and searched for contours
+    only over the rows that can hold a kept center, plus `margin` rows of
+    context and a `halo` that absorbs the border effects of the adaptive
+    threshold and morphology. `widen_window` then checks the candidates that
+    reach the edge of that context; if any could continue outside the window
+    far enough to change the result, the caller reprocesses a wider window,
+    so counts match uncropped processing exactly.
+    """
+
+    def __init__(self, min_center_y=0.4, bands=(), polygons=(), mask=None, crop=True,
+                 halo=32, margin=64):
+        self.min_center_y = min_center_y
+        self.bands = [tuple(band) for band in bands or ()]
+        self.polygons = [np.asarray(polygon, dtype=np.float64) for polygon in polygons or ()]
+        if isinstance(mask, str):
+            mask_image = cv2.imread(mask, cv2.IMREAD_GRAYSCALE)
+            if mask_image is None:
+                raise ValueError(f"Could not read ROI mask image: {mask}")
+            mask = mask_image
+        self.mask_image = mask
+        self.crop = crop
+        self.halo = halo
+        self.margin = margin
+        self._masks = {}
+
+    @classmethod
+    def from_config(cls, params, root=None):
+        """Build a region of interest from the detection_params.roi section."""
+        params = dict(params or {})
+        mask = params.get('mask')
+        if mask and root is not None and not isinstance(mask, np.ndarray):
+            mask = str(root / mask) if hasattr(root, 'joinpath') else f"{root}/{mask}"
+        return cls(
+            min_center_y=params.get('min_center_y', 0.4),
+            bands=params.get('bands') or (),
+            polygons=params.get('polygons') or (),
+            mask=mask,
+            crop=params.get('crop', True),
+            halo=params.get('halo', 32),
+            margin=params.get('margin', 64)
+        )
+
+    @property
+    def is_full_frame(self):
+        """True when only the min_center_y rule restricts detections."""
+        return not self.bands and not self.polygons and self.mask_image is None
+
+    def mask(self, shape):
+        """Full-resolution uint8 ROI mask for a frame shape, or None for the whole frame."""
+        if self.is_full_frame:
+            return None
+        shape = tuple(shape[:2])
+        mask = self._masks.get(shape)
+        if mask is None:
+            height, width = shape
+            if self.bands or self.polygons:
+                mask = np.zeros(shape, dtype=np.uint8)
+                for top, bottom in self.bands:
+                    mask[int(round(top * height)):int(round(bottom * height)), :] = 1
+                for polygon in self.polygons:
+                    points = np.round(polygon * (width, height)).astype(np.int32)
+                    cv2.fillPoly(mask, [points], 1)
+            else:
+                mask = np.ones(shape, dtype=np.uint8)
+            if self.mask_image is not None:
+                resized = cv2.resize(self.mask_image, (width, height),
+                                     interpolation=cv2.INTER_NEAREST)
+                mask[resized == 0] = 0
+            self._masks[shape] = mask
+        return mask
+
+    def center_rows(self, image_shape, scale, level_height):
+        """
+        Inclusive range of bounding box center rows, in level coordinates,
+        that can be kept at this scale, or None when no row can.
+        """
+        first = math.ceil(self.min_center_y * image_shape[0])
+        last = level_height - 1
+        mask = self.mask(image_shape)
+        if mask is not None:
+            rows = np.flatnonzero(mask.any(axis=1))
+            if rows.size == 0:
+                return None
+            first = max(first, int(math.floor(rows[0] * scale)))
+            last = min(last, int(math.ceil((rows[-1] + 1) * scale)))
+        if first > last:
+            return None
+        return first, last
+
+    def window(self, center_rows, level_height, crop=None):
+        """
+        Rows (start, stop) of a level to process for a range of center rows;
+        `crop` overrides the configured setting.
+        """
+        if not (self.crop if crop is None else crop):
+            return 0, level_height
+        first, last = center_rows
+        extent = self.margin + self.halo
+        return max(0, first - extent), min(level_height, last + 1 + extent)
+
+    def widen_window(self, tops, bottoms, window, center_rows, level_height):
+        """
+        Check candidates found in a cropped window against the full level,
+        given the first and last row of every candidate.
+
+        Rows more than `halo` inside the window match the full level; a
+        component crossing the first such row at the top (or the last at the
+        bottom) is safe only if it, and anything it could enclose, stays clear
+        of the center rows. Returns None when the kept candidates are exactly
+        those of the full level, otherwise a wider window that takes in the
+        offending components, to be processed instead.
+        """
+        start, stop = window
+        check_top = start > 0
+        check_bottom = stop < level_height
+        if len(tops) == 0 or not (check_top or check_bottom):
+            return None
+        first, last = center_rows
+        top_row = start + self.halo
+        bottom_row = stop - 1 - self.halo
+
+        extent = self.margin + self.halo
+        new_start, new_stop = start, stop
+        if check_top:
+            crossing = (tops <= top_row) & (bottoms >= top_row)
+            if crossing.any() and bottoms[crossing].max() >= first:
+                new_start = max(0, int(tops[crossing].min()) - extent)
+        if check_bottom:
+            crossing = (tops <= bottom_row) & (bottoms >= bottom_row)
+            if crossing.any() and tops[crossing].min() <= last:
+                new_stop = min(level_height, int(bottoms[crossing].max()) + 1 + extent)
+        if (new_start, new_stop) == (start, stop):
+            return None
+        return new_start, new_stop
+
+    def contains(self, image_shape, x, y):
+        """Whether full-resolution points (scalars or arrays) lie inside the ROI mask."""
+        mask = self.mask(image_shape)
+        if mask is None:
+            return np.ones(np.shape(x), dtype=bool) if np.ndim(x) else True
+        height, width = mask.shape
+        rows = np.clip(np.asarray(y).astype(np.int64), 0, height - 1)
+        cols = np.clip(np.asarray(x).astype(np.int64), 0, width - 1)
+        return mask[rows, cols] != 0
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import numpy as np
+from .merge import OVERLAP_METRICS
+from .roi import RegionOfInterest
+
+FILTER_ENGINE_NAMES = ('contours', 'components')
+# detection_params entries that change how frames are run, not the results
+RUNTIME_KEYS = ('parallel', 'result_store', 'tiling')
+
+DEFAULT_DETECTION_PARAMS = {
+    'scales': [1.0, 0.75, 0.5],
+    'min_size': 100,
+    'max_size': 3000,
+    'aspect_ratio': {
+        'distant': {'min': 0.2, 'max': 4.0},
+        'near': {'min': 0.3, 'max': 3.0},
+    },
+    'solidity_threshold': {'distant': 0.2, 'near': 0.3},
+    'threshold': {
+        'distant': {'block_size': 21, 'c': 4},
+        'near': {'block_size': 31, 'c': 8},
+    },
+    'morphology_kernel': 3,
+    'final_kernel': 5,
+    'filter_engine': 'contours',
+    'merge': {'enabled': True, 'overlap': 0.5, 'metric': 'ios', 'cross_scale_only': True},
+    'tiling': {'enabled': False, 'tile_size': 256, 'workers': 1},
+}
+
+def _param(params, *keys):
+    """Nested detection parameter, falling back to DEFAULT_DETECTION_PARAMS."""
+    for source in (params, DEFAULT_DETECTION_PARAMS):
+        value = source
+        for key in keys:
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is not None:
+            return value
+    return None
+
+class ScaleSettings:
+    """Area bounds and morphology kernels for one pyramid level."""
+    __slots__ = ('scale', 'min_size', 'max_size', 'kernel_open', 'kernel_close', 'support')
+
+    def __init__(self, scale, min_size, max_size, block_size, morphology_kernel=3):
+        self.scale = scale
+        # Scale-specific size filtering: smaller sizes for distant objects
+        self.min_size = int(min_size * scale * scale)
+        self.max_size = int(max_size * scale * scale)
+        kernel_size = max(2, int(morphology_kernel * scale))
+        self.kernel_open = np.ones((kernel_size, kernel_size), np.uint8)
+        self.kernel_close = np.ones((kernel_size + 2, kernel_size + 2), np.uint8)
+        # Rows over which threshold and morphology border effects can spread
+        self.support = block_size // 2 + 2 * kernel_size + 2
+
+class DetectorSettings:
+    """
+    Detection parameters compiled once, so frames pay no setup cost.
+
+    Built from the detection_params section of config.yaml (missing keys fall
+    back to DEFAULT_DETECTION_PARAMS, the values the detector always used).
+    Holds per-scale area bounds and kernels, the adaptive threshold and shape
+    limits for distant and near regions, the contour filter engine, the
+    cross-scale merge options, the tiling options, the FramePreprocessor
+    options and the RegionOfInterest.
+
+    `reduction` is the factor frames were decoded smaller by
+    (loading_params.reduction). Area bounds are given in full-resolution
+    pixels and scaled to the frames, and detections are reported in
+    full-resolution pixels, so they match labels made on the original images.
+    """
+
+    def __init__(self, params=None, root=None, reduction=1):
+        params = params or {}
+        self.params = params
+        self.reduction = int(reduction or 1)
+
+        self.distant_threshold = (int(_param(params, 'threshold', 'distant', 'block_size')),
+                                  _param(params, 'threshold', 'distant', 'c'))
+        self.near_threshold = (int(_param(params, 'threshold', 'near', 'block_size')),
+                               _param(params, 'threshold', 'near', 'c'))
+        self.distant_aspect_ratio = (_param(params, 'aspect_ratio', 'distant', 'min'),
+                                     _param(params, 'aspect_ratio', 'distant', 'max'))
+        self.near_aspect_ratio = (_param(params, 'aspect_ratio', 'near', 'min'),
+                                  _param(params, 'aspect_ratio', 'near', 'max'))
+        self.distant_solidity = _param(params, 'solidity_threshold', 'distant')
+        self.near_solidity = _param(params, 'solidity_threshold', 'near')
+
+        block_size = max(self.distant_threshold[0], self.near_threshold[0])
+        area = self.reduction ** 2
+        self.levels = tuple(ScaleSettings(float(scale), _param(params, 'min_size') / area,
+                                          _param(params, 'max_size') / area,
+                                          block_size, _param(params, 'morphology_kernel'))
+                            for scale in _param(params, 'scales'))
+        if not self.levels:
+            raise ValueError("detection_params.scales must list at least one scale")
+        self.scales = tuple(level.scale for level in self.levels)
+
+        self.filter_engine = _param(params, 'filter_engine')
+        if self.filter_engine not in FILTER_ENGINE_NAMES:
+            raise ValueError(f"Unknown filter engine: {self.filter_engine}")
+
+        # Cross-scale duplicate suppression
+        self.merge = {key: _param(params, 'merge', key)
+                      for key in DEFAULT_DETECTION_PARAMS['merge']}
+        if self.merge['metric'] not in OVERLAP_METRICS:
+            raise ValueError(f"Unknown overlap metric: {self.merge['metric']}")
+
+        # Row bands each level is processed in, for frames too large to process at once
+        self.tiling = {key: _param(params, 'tiling', key)
+                       for key in DEFAULT_DETECTION_PARAMS['tiling']}
+
+        final_kernel = int(_param(params, 'final_kernel'))
+        self.kernel_final = np.ones((final_kernel, final_kernel), np.uint8)
+
+        # Preprocessing options (pyramid method, motion threshold, blur) for
+        # FramePreprocessor, with the pyramid matching the scales above
+        self.preprocess = dict(params.get('preprocess') or {})
+        self.preprocess['scales'] = self.scales
+
+        # The crop halo must cover the border effects of the largest kernels
+        self.roi = RegionOfInterest.from_config(params.get('roi'), root)
+        self.roi.halo = max(self.roi.halo, max(level.support for level in self.levels))
+
+    @property
+    def version(self):
+        """Hash of everything that affects detection results, for result caching."""
+        digest = hashlib.sha256(json.dumps(
+            {key: value for key, value in self.params.items() if key not in RUNTIME_KEYS},
+            sort_keys=True, default=str).encode('utf-8'))
+        if self.reduction != 1:
+            digest.update(f"reduction:{self.reduction}".encode('ascii'))
+        if self.roi.mask_image is not None:
+            digest.update(np.ascontiguousarray(self.roi.mask_image).tobytes())
+        return digest.hexdigest()[:32]
+
+    @classmethod
+    def from_config(cls, cfg):
+        """Compile the detection_params section of a Config for its decode reduction."""
+        return cls(cfg.detection, cfg.project_root, cfg.get_loading_param('reduction') or 1)
+
+DEFAULT_SETTINGS = DetectorSettings()
@@ -0,0 +1,69 @@
+import os
+from .background import OnlineBackgroundModel
+from .people_detector import detect_and_count_people
+from .result import DetectionResult
+from .result_store import detector_version
+from .settings import DEFAULT_SETTINGS
+from utils.image_loader import watch_folder, iter_video_frames
+from utils.profiling import count
+
+def open_frame_source(source, poll_interval=5.0, settle=1.0, idle_timeout=None,
+                      frame_step=1, reduction=1):
+    """
+    Lazily yield (name, frame) pairs from a camera feed: a folder is watched
+    for new snapshots, anything else (video file, stream URL or camera index)
+    is read with cv2.VideoCapture.
+    """
+    if isinstance(source, str) and os.path.isdir(source):
+        return watch_folder(source, poll_interval=poll_interval, settle=settle,
+                            reduction=reduction, idle_timeout=idle_timeout)
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    return iter_video_frames(source, frame_step=frame_step, reduction=reduction)
+
+def count_people_in_stream(frames, settings=None, background_params=None, window=16,
+                           warmup=8, refresh_every=8):
+    """
+    Count people frame by frame in an endless stream of (name, frame) pairs.
+
+    The background is a rolling window of the last `window` frames and is
+    rebuilt every `refresh_every` frames. Detection starts once `warmup`
+    frames have been seen; those first frames are held until then and counted
+    against the first background. Nothing else is kept between frames, so
+    memory is bounded by the window rather than by the length of the stream.
+    Yields one DetectionResult per frame, with its filename and whether the
+    background was refreshed for it (background_updated). When
+    settings.preprocess sets a noise_factor, the window's noise model is
+    refreshed with the background.
+    """
+    if settings is None:
+        settings = DEFAULT_SETTINGS
+    estimator = OnlineBackgroundModel(reservoir_size=window, params=background_params,
+                                      rolling=True)
+    background = noise = None
+    use_noise = bool(settings.preprocess.get('noise_factor'))
+    warmup = max(1, min(warmup, window))
+    pending = []
+    for index, (name, frame) in enumerate(frames):
+        estimator.update(frame)
+        count('stream_frames')
+        pending.append((index, name, frame))
+        if estimator.frames_seen < warmup:
+            continue
+
+        updated = background is None or (estimator.frames_seen - warmup) % refresh_every == 0
+        if updated:
+            background = estimator.model()
+            if use_noise:
+                noise = estimator.noise()
+            version = detector_version(settings, background, noise)
+            count('background_refreshes')
+
+        for index, name, frame in pending:
+            people_count, mask, detections = detect_and_count_people(
+                frame, background, settings=settings, return_detections=True, noise=noise)
+            yield DetectionResult.from_mask(people_count, mask, detections, image_index=index,
+                                            filename=name, version=version,
+                                            background_updated=updated)
+            updated = False
+        pending.clear()
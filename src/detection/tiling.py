@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .parallel import resolve_workers
+
+def tile_bounds(length, tile_size, align=1):
+    """
+    Split [0, length) into consecutive (start, stop) ranges of about
+    `tile_size`, rounded up to a multiple of `align` so every start is too.
+    """
+    tile_size = max(1, int(tile_size))
+    tile_size = -(-tile_size // align) * align
+    return [(start, min(start + tile_size, length)) for start in range(0, length, tile_size)]
+
+def tile_grid(shape, tile_size, align=1):
+    """(rows, cols) ranges of the tiles covering a 2-D shape."""
+    if np.ndim(tile_size) == 0:
+        tile_size = (tile_size, tile_size)
+    return [(rows, cols)
+            for rows in tile_bounds(shape[0], tile_size[0], align)
+            for cols in tile_bounds(shape[1], tile_size[1], align)]
+
+def map_tiles(func, tiles, workers=1):
+    """Apply func to every tile, on `workers` threads (OpenCV releases the GIL)."""
+    workers = min(resolve_workers(workers), len(tiles))
+    if workers <= 1:
+        return [func(tile) for tile in tiles]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, tiles))
+
+def apply_tiled(image, apply_filter, tile_size, halo, workers=1):
+    """
+    Run a neighbourhood filter tile by tile.
+
+    Each tile is filtered with `halo` extra pixels of context on every side
+    (clipped at the image border) and only its own pixels are kept, so when
+    `halo` covers the filter's reach the output equals filtering the whole
+    image, while each call only touches a tile-sized working set.
+    """
+    height, width = image.shape[:2]
+    tiles = tile_grid((height, width), tile_size)
+    if len(tiles) == 1:
+        return apply_filter(image)
+    result = np.empty_like(image)
+
+    def run(tile):
+        (top, bottom), (left, right) = tile
+        y0, y1 = max(0, top - halo), min(height, bottom + halo)
+        x0, x1 = max(0, left - halo), min(width, right + halo)
+        filtered = apply_filter(image[y0:y1, x0:x1])
+        result[top:bottom, left:right] = filtered[top - y0:bottom - y0, left - x0:right - x0]
+
+    map_tiles(run, tiles, workers)
+    return result
@@ -0,0 +1,105 @@
+# src/evaluation/ground_truth.py
+import os
+import numpy as np
+
+GROUND_TRUTH_COLUMNS = ['label', 'x', 'y', 'image', 'width', 'height']
+SIDECAR_SUFFIX = '.gt.npz'
+
+class GroundTruthStore:
+    """
+    Ground truth points grouped by image in contiguous arrays.
+    Points for image i live in points[offsets[i]:offsets[i + 1]], so a
+    lookup is a dictionary hit plus an array slice.
+    """
+
+    def __init__(self, image_names, offsets, points):
+        self.image_names = [str(name) for name in image_names]
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self._index = {name: i for i, name in enumerate(self.image_names)}
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Group label rows by image name."""
+        import pandas as pd  # Only needed when the labels CSV is parsed
+        codes, image_names = pd.factorize(df['image'])
+        order = np.argsort(codes, kind='stable')
+        points = df[['x', 'y']].to_numpy(dtype=np.float64)[order]
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(image_names)))))
+        return cls(image_names, offsets, points)
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        """Parse a labels CSV (label, x, y, image, width, height) without a header."""
+        import pandas as pd
+        df = pd.read_csv(csv_path, header=None, names=GROUND_TRUTH_COLUMNS,
+                         usecols=['x', 'y', 'image'])
+        return cls.from_dataframe(df)
+
+    def save(self, path, **metadata):
+        """Write the store to an .npz file."""
+        np.savez(path, image_names=np.array(self.image_names, dtype=str),
+                 offsets=self.offsets, points=self.points, **metadata)
+
+    def get(self, image_name, default=None):
+        """Return an (N, 2) array of (x, y) points for an image."""
+        i = self._index.get(image_name)
+        if i is None:
+            return np.empty((0, 2)) if default is None else default
+        return self.points[self.offsets[i]:self.offsets[i + 1]]
+
+    def count(self, image_name):
+        """Number of labelled people in an image."""
+        i = self._index.get(image_name)
+        return 0 if i is None else int(self.offsets[i + 1] - self.offsets[i])
+
+    def __getitem__(self, image_name):
+        if image_name not in self._index:
+            raise KeyError(image_name)
+        return self.get(image_name)
+
+    def __contains__(self, image_name):
+        return image_name in self._index
+
+    def __len__(self):
+        return len(self.image_names)
+
+    def keys(self):
+        return list(self.image_names)
+
+def _source_signature(csv_path):
+    """Modification time and size identifying a version of the labels CSV."""
+    stat = os.stat(csv_path)
+    return np.int64(stat.st_mtime_ns), np.int64(stat.st_size)
+
+def load_ground_truth_store(csv_path, cache=True):
+    """
+    Load ground truth labels into a GroundTruthStore.
+    When `cache` is set, the parsed arrays are kept in a binary sidecar next
+    to the CSV (<csv>.gt.npz) and reused until the CSV's mtime or size changes.
+    An already loaded store is returned unchanged.
+    """
+    if isinstance(csv_path, GroundTruthStore):
+        return csv_path
+    csv_path = str(csv_path)
+    sidecar = csv_path + SIDECAR_SUFFIX
+    mtime_ns, size = _source_signature(csv_path)
+
+    if cache and os.path.exists(sidecar):
+        try:
+            with np.load(sidecar) as data:
+                if data['source_mtime_ns'] == mtime_ns and data['source_size'] == size:
+                    return GroundTruthStore(data['image_names'], data['offsets'], data['points'])
+        except (OSError, KeyError, ValueError):
+            pass  # Unreadable or outdated sidecar: rebuild it below
+
+    store = GroundTruthStore.from_csv(csv_path)
+    if cache:
+        try:
+            # Write to a temporary file first so readers never see a partial sidecar
+            tmp_path = sidecar + '.tmp.npz'
+            store.save(tmp_path, source_mtime_ns=mtime_ns, source_size=size)
+            os.replace(tmp_path, sidecar)
+        except OSError:
+            pass  # Read-only location: the store still works, just uncached
+    return store
@@ -0,0 +1,97 @@
+# src/evaluation/matching.py
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+MATCHING_METHODS = ('greedy', 'hungarian')
+
+def candidate_pairs(ground_truth_coords, detection_coords, max_distance):
+    """
+    Find every ground truth / detection pair closer than max_distance.
+    Returns (gt_indices, det_indices, distances) arrays, using KD-trees so
+    that only nearby pairs are ever materialized.
+    """
+    gt_tree = cKDTree(ground_truth_coords)
+    det_tree = cKDTree(detection_coords)
+    pairs = gt_tree.sparse_distance_matrix(det_tree, max_distance, output_type='ndarray')
+    return pairs['i'].astype(np.intp), pairs['j'].astype(np.intp), pairs['v']
+
+def _greedy_matching(gt_idx, det_idx, distances, n_gt, n_det):
+    """Repeatedly match the closest unmatched pair."""
+    # Closest pairs first; ties broken by ground truth then detection index
+    order = np.lexsort((det_idx, gt_idx, distances))
+    gt_matched = np.zeros(n_gt, dtype=bool)
+    det_matched = np.zeros(n_det, dtype=bool)
+    keep = []
+    for k in order:
+        g, d = gt_idx[k], det_idx[k]
+        if not gt_matched[g] and not det_matched[d]:
+            gt_matched[g] = det_matched[d] = True
+            keep.append(k)
+    keep = np.array(keep, dtype=np.intp)
+    return gt_idx[keep], det_idx[keep], distances[keep]
+
+def _hungarian_matching(gt_idx, det_idx, distances, n_gt, n_det, max_distance):
+    """
+    Optimal assignment on the sparse candidate graph.
+    Maximizes the number of matches, then minimizes the total distance. Each
+    connected component of the candidate graph is solved independently, so
+    the dense cost matrices stay small even for crowded frames.
+    """
+    graph = coo_matrix((np.ones(len(gt_idx)), (gt_idx, n_gt + det_idx)),
+                       shape=(n_gt + n_det, n_gt + n_det))
+    _, labels = connected_components(graph, directed=False)
+    pair_labels = labels[gt_idx]
+
+    matched_gt, matched_det, matched_dist = [], [], []
+    order = np.argsort(pair_labels, kind='stable')
+    bounds = np.flatnonzero(np.diff(pair_labels[order])) + 1
+    for component in np.split(order, bounds):
+        if len(component) == 0:
+            continue
+        if len(component) == 1:
+            matched_gt.append(gt_idx[component])
+            matched_det.append(det_idx[component])
+            matched_dist.append(distances[component])
+            continue
+
+        rows, row_pos = np.unique(gt_idx[component], return_inverse=True)
+        cols, col_pos = np.unique(det_idx[component], return_inverse=True)
+        # Non-candidate pairs cost more than any full set of real matches
+        unmatched_cost = max_distance * (min(len(rows), len(cols)) + 1) + 1
+        cost = np.full((len(rows), len(cols)), unmatched_cost, dtype=np.float64)
+        cost[row_pos, col_pos] = distances[component]
+
+        r, c = linear_sum_assignment(cost)
+        valid = cost[r, c] < unmatched_cost
+        matched_gt.append(rows[r[valid]])
+        matched_det.append(cols[c[valid]])
+        matched_dist.append(cost[r[valid], c[valid]])
+
+    if not matched_gt:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0, dtype=np.float64)
+    return (np.concatenate(matched_gt), np.concatenate(matched_det),
+            np.concatenate(matched_dist))
+
+def match_points(ground_truth_coords, detection_coords, max_distance=50, method='greedy'):
+    """
+    Match ground truth points to detections no further than max_distance apart.
+    method is 'greedy' (closest pair first) or 'hungarian' (optimal assignment).
+    Returns (gt_indices, det_indices, distances) of the matched pairs.
+    """
+    if method not in MATCHING_METHODS:
+        raise ValueError(f"Unknown matching method: {method}")
+    gt_array = np.asarray(ground_truth_coords, dtype=np.float64).reshape(-1, 2)
+    det_array = np.asarray(detection_coords, dtype=np.float64).reshape(-1, 2)
+    if len(gt_array) == 0 or len(det_array) == 0:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0, dtype=np.float64)
+
+    gt_idx, det_idx, distances = candidate_pairs(gt_array, det_array, max_distance)
+    if method == 'greedy':
+        return _greedy_matching(gt_idx, det_idx, distances, len(gt_array), len(det_array))
+    return _hungarian_matching(gt_idx, det_idx, distances,
+                               len(gt_array), len(det_array), max_distance)
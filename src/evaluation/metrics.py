@@ -1,41 +1,42 @@
 # src/evaluation/metrics.py
 import numpy as np
-import pandas as pd
 from collections import defaultdict
+from .ground_truth import load_ground_truth_store
+from .matching import match_points
+from detection.result_store import evaluation_key
+from utils.profiling import timed
 
 def load_ground_truth(csv_path):
     """
     Load and process ground truth data from CSV file.
-    Returns a dictionary with image filenames as keys and lists of coordinates as values.
+    Returns a GroundTruthStore mapping image filenames to (N, 2) coordinate arrays.
     """
-    df = pd.read_csv(csv_path, header=None, 
-                     names=['label', 'x', 'y', 'image', 'width', 'height'])
-    
-    # Group by image filename
-    ground_truth = defaultdict(list)
-    for _, row in df.iterrows():
-        ground_truth[row['image']].append((row['x'], row['y']))
-    
-    return ground_truth
+    return load_ground_truth_store(csv_path)
 
 def create_detection_mask(detections, image_shape):
     """
     Convert detection mask to coordinate list.
-    Returns list of (x,y) coordinates where detections were made.
+    Returns an (N, 2) array of (x,y) coordinates where detections were made.
+    """
+    ys, xs = np.nonzero(detections[:image_shape[0], :image_shape[1]])
+    return np.column_stack((xs, ys))
+
+def detection_coordinates(result):
+    """
+    Detection points for a DetectionResult: the centroids of the contours the
+    detector kept. Every result carries its detections (possibly none), so
+    the mask is never used for matching.
     """
-    coords = []
-    for y in range(image_shape[0]):
-        for x in range(image_shape[1]):
-            if detections[y, x] > 0:
-                coords.append((x, y))
-    return coords
+    return np.asarray(result.centroids, dtype=np.float64).reshape(-1, 2)
 
-def calculate_detection_metrics(ground_truth_coords, detection_coords, max_distance=50):
+def calculate_detection_metrics(ground_truth_coords, detection_coords, max_distance=50,
+                                matching='greedy'):
     """
     Calculate detection metrics including MSE and matching statistics.
-    Uses nearest neighbor matching with maximum distance threshold.
+    Matches points within a maximum distance threshold, either greedily by
+    nearest neighbor or optimally ('hungarian'); see evaluation.matching.
     """
-    if not ground_truth_coords or not detection_coords:
+    if len(ground_truth_coords) == 0 or len(detection_coords) == 0:
         return {
             'mse': float('inf'),
             'matched_detections': 0,
@@ -45,49 +46,17 @@ def calculate_detection_metrics(ground_truth_coords, detection_coords, max_dista
             'recall': 0.0
         }
     
-    # Convert to numpy arrays for efficient computation
-    gt_array = np.array(ground_truth_coords)
-    det_array = np.array(detection_coords)
-    
-    # Calculate distance matrix between all ground truth and detection points
-    distances = np.sqrt(((gt_array[:, np.newaxis] - det_array) ** 2).sum(axis=2))
-    
-    # Initialize matching arrays
-    gt_matched = np.zeros(len(gt_array), dtype=bool)
-    det_matched = np.zeros(len(det_array), dtype=bool)
-    squared_errors = []
-    
-    # Match points using nearest neighbor with distance threshold
-    while True:
-        # Find minimum distance that hasn't been matched
-        unmatched_distances = distances[~gt_matched][:, ~det_matched]
-        if unmatched_distances.size == 0:
-            break
-            
-        min_dist_idx = np.unravel_index(np.argmin(unmatched_distances), 
-                                       unmatched_distances.shape)
-        min_dist = unmatched_distances[min_dist_idx]
-        
-        if min_dist > max_distance:
-            break
-            
-        # Get original indices
-        gt_idx = np.where(~gt_matched)[0][min_dist_idx[0]]
-        det_idx = np.where(~det_matched)[0][min_dist_idx[1]]
-        
-        # Mark as matched and add to squared errors
-        gt_matched[gt_idx] = True
-        det_matched[det_idx] = True
-        squared_errors.append(min_dist ** 2)
+    _, _, distances = match_points(ground_truth_coords, detection_coords,
+                                   max_distance, matching)
     
     # Calculate metrics
-    matched_detections = len(squared_errors)
-    false_positives = np.sum(~det_matched)
-    false_negatives = np.sum(~gt_matched)
+    matched_detections = len(distances)
+    false_positives = len(detection_coords) - matched_detections
+    false_negatives = len(ground_truth_coords) - matched_detections
     
-    mse = np.mean(squared_errors) if squared_errors else float('inf')
-    precision = matched_detections / len(detection_coords) if detection_coords else 0
-    recall = matched_detections / len(ground_truth_coords) if ground_truth_coords else 0
+    mse = float(np.mean(distances ** 2)) if matched_detections else float('inf')
+    precision = matched_detections / len(detection_coords)
+    recall = matched_detections / len(ground_truth_coords)
     
     return {
         'mse': mse,
@@ -98,9 +67,14 @@ def calculate_detection_metrics(ground_truth_coords, detection_coords, max_dista
         'recall': recall
     }
 
-def evaluate_detections(results, ground_truth_file, image_filenames):
+@timed('evaluate_detections')
+def evaluate_detections(results, ground_truth_file, image_filenames, max_distance=50,
+                        matching='greedy', store=None):
     """
     Evaluate detection results against ground truth data.
+    With a ResultStore, per-image metrics of results carrying a frame hash are
+    reused while the result and that image's labels are unchanged, so only
+    new or changed frames are scored; the averages are rebuilt from them.
     """
     # Load ground truth data
     ground_truth = load_ground_truth(ground_truth_file)
@@ -109,15 +83,23 @@ def evaluate_detections(results, ground_truth_file, image_filenames):
     overall_metrics = defaultdict(list)
     
     for result, filename in zip(results, image_filenames):
-        # Get detection coordinates from mask
-        detection_coords = create_detection_mask(result['detection_mask'], 
-                                              result['detection_mask'].shape)
+        # One detection point per detected blob
+        detection_coords = detection_coordinates(result)
         
         # Get ground truth coordinates for this image
         gt_coords = ground_truth.get(filename, [])
         
-        # Calculate metrics
-        metrics = calculate_detection_metrics(gt_coords, detection_coords)
+        # Calculate metrics, or reuse those stored for this result and labels
+        metrics = None
+        stored = store is not None and result.frame_hash is not None
+        if stored:
+            key = evaluation_key(gt_coords, max_distance, matching)
+            metrics = store.get_metrics(result.frame_hash, result.version, key)
+        if metrics is None:
+            metrics = calculate_detection_metrics(gt_coords, detection_coords,
+                                                  max_distance, matching)
+            if stored:
+                store.put_metrics(result.frame_hash, result.version, key, metrics)
         metrics['filename'] = filename
         all_metrics.append(metrics)
         
@@ -0,0 +1,194 @@
+# src/evaluation/sweep.py
+import copy
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from detection.parallel import resolve_workers
+from detection.people_detector import detect_and_count_people
+from detection.preprocess import FramePreprocessor
+from detection.result import DetectionResult
+from detection.settings import DetectorSettings
+from .metrics import evaluate_detections
+
+SEARCH_MODES = ('grid', 'random')
+
+def set_param(params, path, value):
+    """Set a dotted key such as 'threshold.near.c' in a nested parameter dictionary."""
+    keys = path.split('.')
+    for key in keys[:-1]:
+        params = params.setdefault(key, {})
+    params[keys[-1]] = value
+
+def _sample(values, rng):
+    """Draw a value from a list of choices or a {min, max} range (integer if both bounds are)."""
+    if isinstance(values, dict):
+        low, high = values['min'], values['max']
+        if isinstance(low, int) and isinstance(high, int):
+            return int(rng.integers(low, high + 1))
+        return float(rng.uniform(low, high))
+    return values[int(rng.integers(len(values)))]
+
+def search_space(space, mode='grid', trials=20, seed=None):
+    """
+    Parameter overrides to try, as {dotted key: value} dictionaries.
+    'grid' enumerates every combination of the listed values; 'random' draws
+    `trials` distinct combinations, from lists or {min, max} ranges.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+    keys = list(space)
+    if mode == 'grid':
+        for key in keys:
+            if isinstance(space[key], dict):
+                raise ValueError(f"Grid search needs a list of values for '{key}'")
+        return [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+
+    rng = np.random.default_rng(seed)
+    overrides, seen = [], set()
+    for _ in range(trials * 20):  # Bounded retries when the space is small
+        if len(overrides) == trials:
+            break
+        override = {key: _sample(space[key], rng) for key in keys}
+        signature = json.dumps(override, sort_keys=True, default=str)
+        if signature not in seen:
+            seen.add(signature)
+            overrides.append(override)
+    return overrides
+
+def pareto_front(points):
+    """Indices of the points not dominated by another (every coordinate is maximized)."""
+    points = np.asarray(points, dtype=np.float64).reshape(len(points), -1)
+    front = []
+    for i, point in enumerate(points):
+        dominated = np.all(points >= point, axis=1) & np.any(points > point, axis=1)
+        if not dominated.any():
+            front.append(i)
+    return front
+
+def prepare_frames(images, background, preprocess, noise=None):
+    """Preprocess every frame once for one set of FramePreprocessor options."""
+    preprocessor = FramePreprocessor(background, noise=noise, **preprocess)
+    return [preprocessor.prepare(image).detach() for image in images]
+
+def run_trial(prepared_frames, settings, ground_truth, filenames, max_distance=50,
+              matching='greedy'):
+    """Detect on preprocessed frames with one DetectorSettings and score the results."""
+    start = time.perf_counter()
+    results = []
+    for i, prepared in enumerate(prepared_frames):
+        people_count, mask, detections = detect_and_count_people(
+            None, settings=settings, return_detections=True, prepared=prepared)
+        results.append(DetectionResult.from_mask(people_count, mask, detections, image_index=i))
+    elapsed = time.perf_counter() - start
+
+    metrics = evaluate_detections(results, ground_truth, filenames, max_distance, matching)
+    matched = metrics['total_matched']
+    detected = matched + metrics['total_false_positives']
+    labelled = matched + metrics['total_false_negatives']
+    precision = matched / detected if detected else 0.0
+    recall = matched / labelled if labelled else 0.0
+    counts = np.array([result.people_count for result in results])
+    truth = np.array([len(ground_truth.get(filename, [])) for filename in filenames])
+    return {
+        'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        'precision': precision,
+        'recall': recall,
+        'avg_mse': float(metrics['avg_mse']),
+        'count_mae': float(np.mean(np.abs(counts - truth))) if len(counts) else 0.0,
+        'matched': matched,
+        'false_positives': metrics['total_false_positives'],
+        'false_negatives': metrics['total_false_negatives'],
+        'seconds': elapsed,
+        'frames_per_second': len(results) / elapsed if elapsed > 0 else float('inf'),
+    }
+
+def run_sweep(images, background, base_params, overrides, ground_truth, filenames, root=None,
+              objective='f1', workers=1, max_distance=50, matching='greedy', noise=None,
+              reduction=1):
+    """
+    Evaluate detection_params overrides on a set of frames.
+
+    The background (and its noise model, for trials with a noise_factor) is
+    shared by every trial, and each frame is preprocessed (grayscale, motion
+    mask, blurred pyramid) once per distinct set of preprocessing options
+    rather than once per trial. Trials run on
+    `workers` threads over those shared arrays; with several workers the
+    timings include contention between trials. The base parameters are
+    always tried first. Returns the trials, each with its overrides and
+    scores and whether it is on the Pareto front of `objective` (higher is
+    better, or lower for 'avg_mse' and 'count_mae') against frames per second.
+    `reduction` is the factor the images were decoded smaller by.
+    """
+    trials = [{'trial': 0, 'overrides': {}}]
+    trials += [{'trial': i + 1, 'overrides': override} for i, override in enumerate(overrides)]
+
+    # Compile every trial's settings and group trials by preprocessing options
+    groups = {}
+    for trial in trials:
+        params = copy.deepcopy(base_params)
+        for path, value in trial['overrides'].items():
+            set_param(params, path, value)
+        try:
+            trial['settings'] = DetectorSettings(params, root, reduction)
+        except (ValueError, TypeError) as e:
+            trial['error'] = str(e)
+            continue
+        key = json.dumps(trial['settings'].preprocess, sort_keys=True, default=str)
+        groups.setdefault(key, []).append(trial)
+
+    def evaluate(trial, prepared_frames):
+        try:
+            trial.update(run_trial(prepared_frames, trial['settings'], ground_truth, filenames,
+                                   max_distance, matching))
+        except cv2.error as e:
+            trial['error'] = str(e).strip().splitlines()[-1]
+        print(f"Trial {trial['trial']}/{len(trials) - 1}: {format_trial(trial)}")
+
+    for group in groups.values():
+        start = time.perf_counter()
+        prepared_frames = prepare_frames(images, background, group[0]['settings'].preprocess,
+                                         noise)
+        print(f"Preprocessed {len(prepared_frames)} frames for {len(group)} trials "
+              f"in {time.perf_counter() - start:.2f}s")
+        with ThreadPoolExecutor(max_workers=resolve_workers(workers)) as executor:
+            list(executor.map(lambda trial: evaluate(trial, prepared_frames), group))
+        del prepared_frames
+
+    scored = [trial for trial in trials if 'error' not in trial]
+    sign = -1 if objective in ('avg_mse', 'count_mae') else 1
+    front = pareto_front([(sign * trial[objective], trial['frames_per_second'])
+                          for trial in scored]) if scored else []
+    for i, trial in enumerate(scored):
+        trial['pareto'] = i in front
+    for trial in trials:
+        trial.pop('settings', None)
+    return trials
+
+def format_trial(trial):
+    """One-line summary of a trial's overrides and scores."""
+    overrides = ', '.join(f"{key}={value:.3g}" if isinstance(value, float) else f"{key}={value}"
+                          for key, value in trial['overrides'].items()) or 'base'
+    if 'error' in trial:
+        return f"{overrides}: failed ({trial['error']})"
+    return (f"{overrides}: F1 {trial['f1']:.3f}, precision {trial['precision']:.3f}, "
+            f"recall {trial['recall']:.3f}, MSE {trial['avg_mse']:.1f}, "
+            f"count MAE {trial['count_mae']:.1f}, {trial['frames_per_second']:.1f} frames/s")
+
+def save_sweep(trials, output_path):
+    """Write one CSV row per trial, overrides as columns."""
+    keys = sorted({key for trial in trials for key in trial['overrides']})
+    columns = ['trial', *keys, 'f1', 'precision', 'recall', 'avg_mse', 'count_mae', 'matched',
+               'false_positives', 'false_negatives', 'seconds', 'frames_per_second', 'pareto',
+               'error']
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for trial in trials:
+            row = {**trial['overrides'], **trial}
+            writer.writerow([row.get(column, '') for column in columns])
@@ -0,0 +1,318 @@
+# src/evaluation/timeseries.py
+import csv
+import os
+import re
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+RECORD_COLUMNS = ['timestamp', 'time', 'filename', 'people_count', 'ground_truth_count',
+                  'abs_error', 'matched_detections', 'false_positives', 'false_negatives',
+                  'rolling_mae', 'version']
+# Bump when the tables change; older series are set aside and started over
+TIMESERIES_VERSION = 2
+# Aggregation periods and their bucket length in seconds; 'all' is one bucket
+PERIODS = {'hour': 3600, 'day': 86400, 'all': None}
+AGGREGATE_COLUMNS = ['frames', 'count_sum', 'count_min', 'count_max', 'labelled',
+                     'ground_truth_sum', 'abs_error_sum', 'sq_error_sum',
+                     'matched_detections', 'false_positives', 'false_negatives']
+
+def frame_timestamp(filename, default=None):
+    """
+    Unix timestamp encoded in a frame name such as '1660114800.jpg', or
+    `default` when the name does not start with one.
+    """
+    match = re.match(r'(\d{9,11})(?:\.\d+)?(?:\D|$)', os.path.basename(filename))
+    return float(match.group(1)) if match else default
+
+def format_time(timestamp):
+    """ISO 8601 UTC time of a Unix timestamp."""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat(timespec='seconds')
+
+def _bucket(timestamp, seconds):
+    return 0 if seconds is None else int(timestamp // seconds * seconds)
+
+def _record_row(frame):
+    """records.csv row of a frame stored as (filename, timestamp, version, count, ...)."""
+    (filename, timestamp, version, people_count, ground_truth_count, abs_error,
+     matched, false_positives, false_negatives, rolling_mae) = frame
+    blank = lambda value: '' if value is None else value
+    return [int(timestamp) if float(timestamp).is_integer() else timestamp,
+            format_time(timestamp), filename, people_count, blank(ground_truth_count),
+            blank(abs_error), blank(matched), blank(false_positives), blank(false_negatives),
+            '' if rolling_mae is None else round(rolling_mae, 3), blank(version)]
+
+class TimeSeriesSink:
+    """
+    Time series of per-frame counts and accuracy.
+
+    Every frame is appended to records.csv as it is added. Hourly, daily and
+    overall aggregates (frame count, count sum/min/max, absolute and squared
+    error against ground truth, matching totals) are updated in place in a
+    small SQLite index, so each frame costs a constant number of row updates
+    and a query over any date range reads one row per hour or day instead
+    of every record. Buckets are UTC.
+
+    A frame is identified by its filename and timestamp and recorded with
+    the detector version that produced it. Adding it again with the same
+    version is skipped, so rerunning the pipeline over the same images does
+    not count them twice; frames without a timestamp in their name need one
+    passed in (the pipeline uses the file's modification time), as the
+    current time makes every addition a new frame. With another version (changed detection parameters
+    or background) its record is replaced: the hour, day and overall buckets
+    it falls in are rebuilt from the stored frames, since a minimum or
+    maximum cannot be subtracted, and records.csv is rewritten. Both happen
+    once before the next query, export or close.
+
+    A rolling mean absolute error over the last `rolling_window` labelled
+    frames is kept with a running sum and written with each record.
+    """
+
+    def __init__(self, folder, rolling_window=24):
+        self.folder = str(folder)
+        os.makedirs(self.folder, exist_ok=True)
+        self.records_path = os.path.join(self.folder, 'records.csv')
+        self._connection = sqlite3.connect(os.path.join(self.folder, 'aggregates.sqlite'))
+        stored_version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if stored_version != TIMESERIES_VERSION:
+            # Written by an older schema: keep its records aside and start over
+            self._connection.executescript("""
+                DROP TABLE IF EXISTS frames;
+                DROP TABLE IF EXISTS aggregates;
+            """)
+            self._connection.execute(f"PRAGMA user_version = {TIMESERIES_VERSION}")
+            if os.path.exists(self.records_path):
+                os.replace(self.records_path, self.records_path + '.old')
+                print(f"Time series format changed; previous records moved to "
+                      f"'{self.records_path}.old'")
+        self._connection.executescript(f"""
+            CREATE TABLE IF NOT EXISTS frames (
+                filename TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                version TEXT,
+                people_count INTEGER NOT NULL,
+                ground_truth_count INTEGER,
+                abs_error INTEGER,
+                matched_detections INTEGER,
+                false_positives INTEGER,
+                false_negatives INTEGER,
+                rolling_mae REAL,
+                PRIMARY KEY (filename, timestamp)
+            );
+            CREATE INDEX IF NOT EXISTS frames_by_time ON frames (timestamp);
+            CREATE TABLE IF NOT EXISTS aggregates (
+                period TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                {', '.join(f'{column} REAL NOT NULL' for column in AGGREGATE_COLUMNS)},
+                PRIMARY KEY (period, bucket)
+            );
+        """)
+
+        # Resume the rolling error from the last labelled frames recorded
+        self.rolling_window = max(1, int(rolling_window))
+        self._load_errors()
+        self._dirty = set()  # (period, bucket) aggregates to rebuild from the frames
+        self._records_stale = False
+        self.replaced = 0  # Frames re-recorded with another detector version
+
+        new_file = not os.path.exists(self.records_path) or os.path.getsize(self.records_path) == 0
+        self._records = open(self.records_path, 'a', newline='')
+        self._writer = csv.writer(self._records)
+        if new_file:
+            self._writer.writerow(RECORD_COLUMNS)
+
+    @property
+    def rolling_mae(self):
+        """Mean absolute count error over the last labelled frames, or None."""
+        return self._error_sum / len(self._errors) if self._errors else None
+
+    def add(self, filename, people_count, timestamp=None, ground_truth_count=None, metrics=None,
+            version=None):
+        """
+        Record one frame. The timestamp defaults to the one in the filename,
+        then to the current time. `ground_truth_count` and the evaluation
+        `metrics` of the frame are only given for labelled frames, `version`
+        is the detector version that counted it. Returns False when the
+        frame was already recorded with the same version.
+        """
+        if timestamp is None:
+            timestamp = frame_timestamp(filename, default=time.time())
+        abs_error = None
+        if ground_truth_count is not None:
+            abs_error = abs(people_count - ground_truth_count)
+        metrics = metrics or {}
+        row = (filename, timestamp, version, people_count, ground_truth_count, abs_error,
+               metrics.get('matched_detections'), metrics.get('false_positives'),
+               metrics.get('false_negatives'))
+
+        previous = self._connection.execute(
+            "SELECT version FROM frames WHERE filename = ? AND timestamp = ?",
+            (filename, timestamp)).fetchone()
+        if previous is not None:
+            if previous[0] == version:
+                return False
+            # Counted again by another detector version: replace the frame in
+            # place and rebuild its buckets before they are read
+            self._connection.execute(
+                "UPDATE frames SET version = ?, people_count = ?, ground_truth_count = ?, "
+                "abs_error = ?, matched_detections = ?, false_positives = ?, false_negatives = ? "
+                "WHERE filename = ? AND timestamp = ?", (*row[2:], filename, timestamp))
+            self._load_errors()
+            self._connection.commit()
+            self._dirty.update((period, _bucket(timestamp, seconds))
+                               for period, seconds in PERIODS.items())
+            self._records_stale = True
+            self.replaced += 1
+            return True
+
+        if abs_error is not None:
+            if len(self._errors) == self._errors.maxlen:
+                self._error_sum -= self._errors[0]
+            self._errors.append(abs_error)
+            self._error_sum += abs_error
+        self._connection.execute("INSERT INTO frames VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (*row, self.rolling_mae))
+
+        labelled = abs_error is not None
+        values = [1, people_count, people_count, people_count, int(labelled),
+                  ground_truth_count or 0, abs_error or 0, (abs_error or 0) ** 2,
+                  metrics.get('matched_detections', 0), metrics.get('false_positives', 0),
+                  metrics.get('false_negatives', 0)]
+        updates = ', '.join(
+            f"{column} = {'min' if column == 'count_min' else 'max'}({column}, excluded.{column})"
+            if column in ('count_min', 'count_max') else f"{column} = {column} + excluded.{column}"
+            for column in AGGREGATE_COLUMNS)
+        for period, seconds in PERIODS.items():
+            self._connection.execute(
+                f"INSERT INTO aggregates VALUES (?, ?, {', '.join('?' * len(values))}) "
+                f"ON CONFLICT (period, bucket) DO UPDATE SET {updates}",
+                (period, _bucket(timestamp, seconds), *values))
+        self._connection.commit()
+
+        if not self._records_stale:
+            self._writer.writerow(_record_row((*row, self.rolling_mae)))
+            self._records.flush()
+        return True
+
+    def _load_errors(self):
+        """Rolling error over the last labelled frames recorded."""
+        recent = self._connection.execute(
+            "SELECT abs_error FROM frames WHERE abs_error IS NOT NULL "
+            "ORDER BY rowid DESC LIMIT ?", (self.rolling_window,)).fetchall()
+        self._errors = deque((row[0] for row in reversed(recent)), maxlen=self.rolling_window)
+        self._error_sum = sum(self._errors)
+
+    def _rebuild(self):
+        """
+        Recompute the aggregates of replaced frames, and the rolling error
+        of every frame from there on, then rewrite records.csv.
+        """
+        for period, bucket in sorted(self._dirty):
+            seconds = PERIODS[period]
+            where, arguments = "", ()
+            if seconds is not None:
+                where, arguments = "WHERE timestamp >= ? AND timestamp < ?", (bucket, bucket + seconds)
+            self._connection.execute("DELETE FROM aggregates WHERE period = ? AND bucket = ?",
+                                     (period, bucket))
+            self._connection.execute(
+                f"INSERT INTO aggregates SELECT ?, ?, COUNT(*), SUM(people_count), "
+                f"MIN(people_count), MAX(people_count), COUNT(abs_error), "
+                f"COALESCE(SUM(ground_truth_count), 0), COALESCE(SUM(abs_error), 0), "
+                f"COALESCE(SUM(abs_error * abs_error), 0), COALESCE(SUM(matched_detections), 0), "
+                f"COALESCE(SUM(false_positives), 0), COALESCE(SUM(false_negatives), 0) "
+                f"FROM frames {where}", (period, bucket, *arguments))
+        self._connection.commit()
+        self._dirty.clear()
+
+        if self._records_stale:
+            self._records.close()
+            self._records = open(self.records_path, 'w', newline='')
+            self._writer = csv.writer(self._records)
+            self._writer.writerow(RECORD_COLUMNS)
+            errors = deque(maxlen=self.rolling_window)
+            rows = self._connection.execute(
+                "SELECT rowid, filename, timestamp, version, people_count, ground_truth_count, "
+                "abs_error, matched_detections, false_positives, false_negatives, rolling_mae "
+                "FROM frames ORDER BY rowid").fetchall()
+            for rowid, *row in rows:
+                if row[5] is not None:
+                    errors.append(row[5])
+                rolling_mae = sum(errors) / len(errors) if errors else None
+                if rolling_mae != row[-1]:
+                    row[-1] = rolling_mae
+                    self._connection.execute("UPDATE frames SET rolling_mae = ? WHERE rowid = ?",
+                                             (rolling_mae, rowid))
+                self._writer.writerow(_record_row(row))
+            self._connection.commit()
+            self._records.flush()
+            self._records_stale = False
+
+    def query(self, period='day', start=None, end=None):
+        """
+        Aggregates per bucket of a period ('hour', 'day' or 'all') between
+        two Unix timestamps, oldest first, with mean count, mean absolute and
+        RMS error, precision and recall derived from the running sums.
+        """
+        if period not in PERIODS:
+            raise ValueError(f"Unknown aggregation period: {period}")
+        self._rebuild()
+        seconds = PERIODS[period]
+        clauses, arguments = ["period = ?"], [period]
+        if start is not None and seconds is not None:
+            clauses.append("bucket >= ?")
+            arguments.append(_bucket(start, seconds))
+        if end is not None and seconds is not None:
+            clauses.append("bucket <= ?")
+            arguments.append(_bucket(end, seconds))
+        rows = self._connection.execute(
+            f"SELECT bucket, {', '.join(AGGREGATE_COLUMNS)} FROM aggregates "
+            f"WHERE {' AND '.join(clauses)} ORDER BY bucket", arguments).fetchall()
+
+        summaries = []
+        for bucket, *values in rows:
+            row = dict(zip(AGGREGATE_COLUMNS, values))
+            labelled = row['labelled']
+            detected = row['matched_detections'] + row['false_positives']
+            labels = row['matched_detections'] + row['false_negatives']
+            summaries.append({
+                'bucket': bucket,
+                'time': format_time(bucket) if seconds is not None else '',
+                'frames': int(row['frames']),
+                'mean_count': row['count_sum'] / row['frames'],
+                'min_count': int(row['count_min']),
+                'max_count': int(row['count_max']),
+                'labelled_frames': int(labelled),
+                'mean_ground_truth': row['ground_truth_sum'] / labelled if labelled else None,
+                'mae': row['abs_error_sum'] / labelled if labelled else None,
+                'rmse': (row['sq_error_sum'] / labelled) ** 0.5 if labelled else None,
+                'precision': row['matched_detections'] / detected if detected else None,
+                'recall': row['matched_detections'] / labels if labels else None,
+            })
+        return summaries
+
+    def export(self):
+        """Write hourly.csv and daily.csv summaries next to the records."""
+        for period, name in (('hour', 'hourly.csv'), ('day', 'daily.csv')):
+            summaries = self.query(period)
+            with open(os.path.join(self.folder, name), 'w', newline='') as f:
+                writer = csv.writer(f)
+                columns = ['bucket', 'time', 'frames', 'mean_count', 'min_count', 'max_count',
+                           'labelled_frames', 'mean_ground_truth', 'mae', 'rmse',
+                           'precision', 'recall']
+                writer.writerow(columns)
+                for summary in summaries:
+                    writer.writerow(['' if summary[column] is None else
+                                     round(summary[column], 3) if isinstance(summary[column], float)
+                                     else summary[column] for column in columns])
+
+    def close(self):
+        self._rebuild()
+        self._records.close()
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,61 +1,382 @@
 # src/main.py
-from utils.image_loader import load_images_from_folder
-from detection.background import create_background_model
-from detection.people_detector import process_beach_images
+from utils.image_loader import load_images_from_folder, iter_images_from_folder, list_image_files
+from detection.background import create_background_model, create_noise_model, OnlineBackgroundModel
+from detection.background_cache import BackgroundCache, background_cache_key, cached_background_model
+from detection.people_detector import iter_beach_images
+from detection.result_store import ResultStore
+from detection.settings import DetectorSettings
+from detection.stream import open_frame_source, count_people_in_stream
 from visualization.visualizer import save_results_with_presentation
 from evaluation.metrics import evaluate_detections
+from evaluation.ground_truth import load_ground_truth_store
+from evaluation.timeseries import TimeSeriesSink, frame_timestamp
+from evaluation.sweep import search_space, run_sweep, format_trial, save_sweep
 from config.default_params import Config
+from utils.profiling import PROFILER
 import os
 
+def stream_options(cfg):
+    """Image stream settings from the loading section of the configuration."""
+    return {
+        'prefetch': cfg.get_loading_param('prefetch') or 0,
+        'workers': cfg.get_loading_param('workers') or 1,
+        'reduction': cfg.get_loading_param('reduction') or 1,
+    }
+
+def stream_images(cfg, filenames=None):
+    """Lazily yield images from the dataset folder, recording their filenames."""
+    for filename, image in iter_images_from_folder(str(cfg.dataset_folder), **stream_options(cfg)):
+        if filenames is not None:
+            filenames.append(filename)
+        yield image
+
+def create_background_from_stream(cfg):
+    """Build the background model one frame at a time without loading every image."""
+    estimator = OnlineBackgroundModel(
+        reservoir_size=cfg.get_background_param('online', 'reservoir_size') or 16,
+        decay=cfg.get_background_param('online', 'decay') or 0.0,
+        params=cfg.background
+    )
+    for image in stream_images(cfg):
+        estimator.update(image)
+    print(f"Added {estimator.frames_seen} images to the background model")
+    return estimator.model()
+
+def background_key(cfg, **extra):
+    """Key of the background built from the current frames and parameters."""
+    return background_cache_key(list_image_files(str(cfg.dataset_folder)), cfg.background,
+                                reduction=cfg.get_loading_param('reduction') or 1, **extra)
+
+def build_background(cfg, build, **extra):
+    """
+    Return the background model, from the cache when the frames and parameters
+    are unchanged. `extra` settings are added to the cache key, so other
+    per-background images can share the cache.
+    """
+    if not cfg.get_background_param('cache', 'enabled'):
+        return build()
+    cache = BackgroundCache(cfg.project_root / (cfg.get_background_param('cache', 'folder') or '.background_cache'),
+                            max_entries=cfg.get_background_param('cache', 'max_entries') or 8)
+    key = background_key(cfg, **extra)
+    if cfg.get_background_param('cache', 'invalidate'):
+        cache.invalidate(key)
+    return cached_background_model(cache, key, build, dataset=str(cfg.dataset_folder),
+                                   model=cfg.get_background_param('model') or 'batch')
+
+def build_noise_model(cfg, images=None, force=False):
+    """
+    Per-pixel noise of the dataset frames for noise-scaled motion thresholds,
+    or None when detection_params.preprocess.noise_factor is not set (unless
+    `force`). Frames are streamed from the dataset folder when images is None.
+    """
+    if not (force or cfg.get_detection_param('preprocess', 'noise_factor')):
+        return None
+    print("Creating background noise model...")
+    return build_background(
+        cfg, lambda: create_noise_model(images if images is not None else stream_images(cfg)),
+        statistic='noise')
+
+def open_result_store(cfg):
+    """Open the per-frame result store, or return None when it is disabled."""
+    if not cfg.get_detection_param('result_store', 'enabled'):
+        return None
+    store = ResultStore(cfg.project_root / (cfg.get_detection_param('result_store', 'path')
+                                            or '.results.sqlite'))
+    if cfg.get_detection_param('result_store', 'invalidate'):
+        store.invalidate()
+    return store
+
+def open_timeseries(cfg):
+    """Open the time-series sink in the output folder, or return None when it is disabled."""
+    if not cfg.get_evaluation_param('timeseries', 'enabled'):
+        return None
+    return TimeSeriesSink(os.path.join(str(cfg.output_folder),
+                                       cfg.get_evaluation_param('timeseries', 'folder') or 'timeseries'),
+                          rolling_window=cfg.get_evaluation_param('timeseries', 'rolling_window') or 24)
+
+def frame_time(cfg, filename):
+    """
+    Timestamp of a dataset frame: the one in its name, else the file's
+    modification time, so reruns over the same files find the same frames.
+    """
+    timestamp = frame_timestamp(filename)
+    if timestamp is None:
+        try:
+            timestamp = os.path.getmtime(os.path.join(str(cfg.dataset_folder), filename))
+        except OSError:
+            pass
+    return timestamp
+
+def record_timeseries(cfg, results, filenames, ground_truth, evaluation_metrics):
+    """Append every frame's count and accuracy to the time series and refresh its summaries."""
+    sink = open_timeseries(cfg)
+    if sink is None:
+        return
+    with sink:
+        recorded = 0
+        for result, filename, metrics in zip(results, filenames,
+                                             evaluation_metrics['per_image_metrics']):
+            labelled = filename in ground_truth
+            recorded += sink.add(filename, result.people_count, timestamp=frame_time(cfg, filename),
+                                 ground_truth_count=ground_truth.count(filename) if labelled else None,
+                                 metrics=metrics if labelled else None, version=result.version)
+        sink.export()
+    print(f"Recorded {recorded - sink.replaced} new frames in the time series at '{sink.folder}'")
+    if sink.replaced:
+        print(f"Replaced {sink.replaced} frames counted with another detector version "
+              f"and rebuilt their hourly and daily aggregates")
+
+def report_profile(cfg):
+    """Print the stage timings and export them next to the other results."""
+    PROFILER.disable()
+    print("\nProfile:")
+    print(PROFILER.format_report())
+    output_path = os.path.join(str(cfg.output_folder), cfg.get_profiling_param('output') or 'profile.json')
+    os.makedirs(str(cfg.output_folder), exist_ok=True)
+    PROFILER.export_json(output_path)
+    if PROFILER.dump_cprofile(os.path.splitext(output_path)[0] + '.prof'):
+        print(f"cProfile stats saved to '{os.path.splitext(output_path)[0]}.prof'")
+    print(f"Profile saved to '{output_path}'")
+
+def run_profiled(cfg, command):
+    """Run command(cfg), profiling it when profiling is enabled in the configuration."""
+    profiling = cfg.get_profiling_param('enabled')
+    if profiling:
+        PROFILER.enable(cprofile=cfg.get_profiling_param('cprofile') or False)
+    try:
+        return command(cfg)
+    finally:
+        if profiling:
+            report_profile(cfg)
+
 def main():
     # Initialize configuration
     cfg = Config()
+    if cfg.get_stream_param('enabled'):
+        run_profiled(cfg, run_stream)
+    elif cfg.get_sweep_param('enabled'):
+        run_profiled(cfg, run_parameter_sweep)
+    else:
+        run_profiled(cfg, run_pipeline)
 
-    print("Loading images...")
-    images, filenames = load_images_from_folder(str(cfg.dataset_folder))
+def prepare_background(cfg):
+    """
+    Build the background model, or load it from the cache.
+    Returns (background, images, filenames); with the online model frames are
+    only streamed, so images and filenames are None. The background is None
+    when there are no images.
+    """
+    if cfg.get_background_param('model') == 'online':
+        # Frames are streamed from disk for every stage, never held all at once
+        print("Creating background model from image stream...")
+        background = build_background(cfg, lambda: create_background_from_stream(cfg))
+        if background is None:
+            print("No images found!")
+        return background, None, None
 
+    print("Loading images...")
+    images, filenames = load_images_from_folder(str(cfg.dataset_folder), **stream_options(cfg))
     if not images:
         print("No images found!")
-        return
+        return None, None, None
 
     print("\nCreating background model...")
-    background = create_background_model(images)
-    
-    if background is not None:
-        print(f"\nProcessing {len(images)} images...")
-        results = process_beach_images(images, background)
-
-        if results:
-            print("\nEvaluating detection results...")
-            evaluation_metrics = evaluate_detections(
-                results, 
-                str(cfg.ground_truth_file), 
-                filenames
-            )
-            
-            print("\nSaving results...")
-            save_results_with_presentation(
-                str(cfg.output_folder),
-                results,
-                images,
-                filenames,
-                background,
-                str(cfg.ground_truth_file)
-            )
-            
-            print("\nEvaluation Results:")
-            print(f"Average MSE: {evaluation_metrics['avg_mse']:.2f}")
-            print(f"Average Precision: {evaluation_metrics['avg_precision']:.2f}")
-            print(f"Average Recall: {evaluation_metrics['avg_recall']:.2f}")
-            print(f"Total Matched Detections: {evaluation_metrics['total_matched']}")
-            print(f"Total False Positives: {evaluation_metrics['total_false_positives']}")
-            print(f"Total False Negatives: {evaluation_metrics['total_false_negatives']}")
-
-            print(f"\nProcessing complete! Results saved in '{cfg.output_folder}'")
-        else:
-            print("\nNo results to save!")
+    background = build_background(cfg, lambda: create_background_model(images, cfg.background))
+    return background, images, filenames
+
+def run_pipeline(cfg):
+    """
+    Run background modelling, detection, evaluation and rendering.
+    Each frame is rendered as soon as it is detected; the compact results are
+    then evaluated together.
+    """
+    background, images, filenames = prepare_background(cfg)
+    if background is None:
+        return
+
+    store = open_result_store(cfg)
+    try:
+        results, filenames = iter_detections(cfg, background, images, filenames, store)
+        report_results(cfg, results, images, filenames, background, store)
+    finally:
+        if store is not None:
+            store.close()
+
+def iter_detections(cfg, background, images=None, filenames=None, store=None):
+    """
+    Lazily detect people in the loaded images, or in frames streamed from the
+    dataset folder when images is None. Returns (results, filenames): an
+    iterator of DetectionResults in frame order and the filenames, which
+    fill up as frames are read when streaming.
+    """
+    noise = build_noise_model(cfg, images)
+    if images is None:
+        filenames = []
+        frames = stream_images(cfg, filenames)
+        print("\nProcessing image stream...")
     else:
+        frames = images
+        print(f"\nProcessing {len(images)} images...")
+    results = iter_beach_images(
+        frames,
+        background,
+        workers=cfg.get_detection_param('parallel', 'workers'),
+        backend=cfg.get_detection_param('parallel', 'backend') or 'thread',
+        settings=DetectorSettings.from_config(cfg),
+        store=store,
+        filenames=filenames,
+        noise=noise
+    )
+    return results, filenames
+
+def detect_frames(cfg, background, images=None, filenames=None):
+    """
+    Detect people in the loaded images, or in frames streamed from the
+    dataset folder when images is None. Returns (results, filenames).
+    """
+    store = open_result_store(cfg)
+    try:
+        results, filenames = iter_detections(cfg, background, images, filenames, store)
+        return list(results), filenames
+    finally:
+        if store is not None:
+            store.close()
+
+def report_results(cfg, results, images, filenames, background, store=None):
+    """
+    Save and summarize the detection results, then evaluate them.
+    `results` may be a lazy iterator: each frame is rendered as it arrives.
+    """
+    # Labels are parsed (or read from their cache) once for all stages
+    ground_truth = load_ground_truth_store(cfg.ground_truth_file)
+
+    collected = []
+
+    def arriving():
+        for result in results:
+            collected.append(result)
+            yield result
+
+    print("\nSaving results as frames are detected...")
+    save_results_with_presentation(
+        str(cfg.output_folder),
+        arriving(),
+        images if images is not None else stream_images(cfg),
+        filenames,
+        background,
+        ground_truth,
+        params=cfg.visualization,
+        reduction=cfg.get_loading_param('reduction') or 1
+    )
+    if not collected:
+        print("\nNo results to save!")
+        return
+
+    evaluation_metrics = evaluate_results(cfg, collected, filenames, ground_truth, store)
+    print_evaluation(evaluation_metrics)
+
+    print(f"\nProcessing complete! Results saved in '{cfg.output_folder}'")
+
+def evaluate_results(cfg, results, filenames, ground_truth, store=None):
+    """Score the results against the labels and append them to the time series."""
+    print("\nEvaluating detection results...")
+    evaluation_metrics = evaluate_detections(
+        results, 
+        ground_truth, 
+        filenames,
+        max_distance=cfg.get_evaluation_param('max_distance'),
+        matching=cfg.get_evaluation_param('matching') or 'greedy',
+        store=store
+    )
+    record_timeseries(cfg, results, filenames, ground_truth, evaluation_metrics)
+    return evaluation_metrics
+
+def print_evaluation(evaluation_metrics):
+    print("\nEvaluation Results:")
+    print(f"Average MSE: {evaluation_metrics['avg_mse']:.2f}")
+    print(f"Average Precision: {evaluation_metrics['avg_precision']:.2f}")
+    print(f"Average Recall: {evaluation_metrics['avg_recall']:.2f}")
+    print(f"Total Matched Detections: {evaluation_metrics['total_matched']}")
+    print(f"Total False Positives: {evaluation_metrics['total_false_positives']}")
+    print(f"Total False Negatives: {evaluation_metrics['total_false_negatives']}")
+
+def stream_source(cfg):
+    """Resolve the stream source: a folder or file under the project root, or as given."""
+    source = cfg.get_stream_param('source')
+    if isinstance(source, str) and not source.isdigit():
+        candidate = cfg.project_root / source
+        if candidate.exists():
+            return str(candidate)
+    return source
+
+def run_stream(cfg):
+    """Count people continuously on a camera feed, appending each count to a CSV file."""
+    source = stream_source(cfg)
+    frames = open_frame_source(
+        source,
+        poll_interval=cfg.get_stream_param('poll_interval') or 5.0,
+        settle=cfg.get_stream_param('settle') or 0.0,
+        idle_timeout=cfg.get_stream_param('idle_timeout'),
+        frame_step=cfg.get_stream_param('frame_step') or 1,
+        reduction=cfg.get_loading_param('reduction') or 1
+    )
+    sink = open_timeseries(cfg) or TimeSeriesSink(os.path.join(str(cfg.output_folder), 'timeseries'))
+    print(f"Counting people in '{source}' (Ctrl+C to stop)...")
+    with sink:
+        try:
+            for result in count_people_in_stream(
+                    frames,
+                    settings=DetectorSettings.from_config(cfg),
+                    background_params=cfg.background,
+                    window=cfg.get_stream_param('window') or 16,
+                    warmup=cfg.get_stream_param('warmup') or 1,
+                    refresh_every=cfg.get_stream_param('refresh_every') or 1):
+                print(f"{result.filename}: {result.people_count} people detected")
+                sink.add(result.filename, result.people_count, version=result.version)
+        except KeyboardInterrupt:
+            print("\nStopped.")
+        sink.export()
+    print(f"Counts saved to '{sink.records_path}'")
+
+def run_parameter_sweep(cfg):
+    """Score many detection_params settings on the dataset and report the Pareto front."""
+    print("Loading images...")
+    images, filenames = load_images_from_folder(str(cfg.dataset_folder), **stream_options(cfg))
+    if not images:
+        print("No images found!")
+        return
+    print("\nCreating background model...")
+    background = build_background(cfg, lambda: create_background_model(images, cfg.background))
+    if background is None:
         print("\nFailed to create background model!")
+        return
+    ground_truth = load_ground_truth_store(cfg.ground_truth_file)
+
+    space = cfg.get_sweep_param('space') or {}
+    noise = build_noise_model(cfg, images, force='preprocess.noise_factor' in space)
+    overrides = search_space(space,
+                             mode=cfg.get_sweep_param('mode') or 'random',
+                             trials=cfg.get_sweep_param('trials') or 24,
+                             seed=cfg.get_sweep_param('seed'))
+    objective = cfg.get_sweep_param('objective') or 'f1'
+    print(f"\nRunning {len(overrides)} trials plus the current parameters...")
+    trials = run_sweep(images, background, cfg.detection, overrides, ground_truth, filenames,
+                       root=cfg.project_root, objective=objective,
+                       workers=cfg.get_sweep_param('workers'),
+                       max_distance=cfg.get_evaluation_param('max_distance'),
+                       matching=cfg.get_evaluation_param('matching') or 'greedy',
+                       noise=noise,
+                       reduction=cfg.get_loading_param('reduction') or 1)
+
+    output_path = os.path.join(str(cfg.output_folder),
+                               cfg.get_sweep_param('output') or 'sweep_results.csv')
+    save_sweep(trials, output_path)
+    front = sorted((trial for trial in trials if trial.get('pareto')),
+                   key=lambda trial: trial['frames_per_second'])
+    print(f"\nPareto front ({objective} against frames per second):")
+    for trial in front:
+        print(f"  Trial {trial['trial']}: {format_trial(trial)}")
+    print(f"\nSweep results saved to '{output_path}'")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,22 +1,174 @@
 import cv2
 import os
 import glob
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+from .profiling import timed
 
-def load_images_from_folder(folder_path):
-    """Load all images from the specified folder."""
+# imread flags for decoding at 1/1, 1/2, 1/4 and 1/8 resolution
+REDUCED_READ_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+def list_image_files(folder_path):
+    """Return the sorted list of image paths in the specified folder."""
     image_files = glob.glob(os.path.join(folder_path, '*.[jJ][pP][gG]')) + \
                   glob.glob(os.path.join(folder_path, '*.[pP][nN][gG]'))
+    return sorted(image_files)
+
+@timed('read_image')
+def read_image(image_path, reduction=1):
+    """Decode an image, optionally at reduced resolution (reduction of 2, 4 or 8)."""
+    if reduction not in REDUCED_READ_FLAGS:
+        raise ValueError(f"Unsupported reduction factor: {reduction}")
+    return cv2.imread(image_path, REDUCED_READ_FLAGS[reduction])
+
+def iter_images_from_folder(folder_path, prefetch=0, workers=1, reduction=1):
+    """
+    Lazily yield (filename, image) pairs from the specified folder.
+    With prefetch > 0, up to `prefetch` images are decoded ahead of the
+    consumer on `workers` background threads; order is preserved.
+    """
+    image_paths = list_image_files(folder_path)
+
+    def decoded(paths_and_images):
+        for image_path, img in paths_and_images:
+            if img is not None:
+                yield os.path.basename(image_path), img
+            else:
+                print(f"Failed to load: {image_path}")
+
+    if prefetch <= 0:
+        yield from decoded((path, read_image(path, reduction)) for path in image_paths)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        def prefetched():
+            queue = deque()
+            path_iter = iter(image_paths)
+            for image_path in path_iter:
+                queue.append((image_path, executor.submit(read_image, image_path, reduction)))
+                if len(queue) >= prefetch:
+                    break
+            while queue:
+                image_path, future = queue.popleft()
+                next_path = next(path_iter, None)
+                if next_path is not None:
+                    queue.append((next_path, executor.submit(read_image, next_path, reduction)))
+                yield image_path, future.result()
+
+        yield from decoded(prefetched())
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def watch_folder(folder_path, poll_interval=5.0, settle=1.0, reduction=1, idle_timeout=None,
+                 history=4096):
+    """
+    Yield (filename, image) pairs for images as they appear in a folder,
+    starting with those already there, in modification-time order.
+    Files are identified by (mtime, name). The last `history` files read are
+    remembered, so a snapshot copied in with an older modification time
+    (cp -p, rsync -t, mv) is still read. Beyond that only the newest
+    forgotten file is kept as a watermark, so memory is bounded by `history`
+    and not by the number of files. A file arriving older than the watermark
+    is skipped, with a message on the first poll after its inode changed
+    (copying or moving it in sets its ctime). A file is read once it has not
+    been modified for `settle` seconds, so partly written snapshots are
+    skipped until complete. Stops after `idle_timeout` seconds without a new
+    file (never when None).
+
+    Each poll lists and stats every file in the folder, so its cost is
+    O(folder); move processed snapshots out of a folder that keeps growing.
+    """
+    seen = OrderedDict()  # Keys of the files read most recently, oldest first
+    watermark = None  # Newest key forgotten from `seen`
+    previous_poll = None  # time.time_ns() when the previous poll listed the folder
+    last_new = time.monotonic()
+    while True:
+        poll_started = time.time_ns()
+        now = poll_started / 1e9
+        pending = []
+        for image_path in list_image_files(folder_path):
+            try:
+                stat = os.stat(image_path)
+            except FileNotFoundError:
+                continue
+            key = (stat.st_mtime_ns, os.path.basename(image_path))
+            if key in seen:
+                continue
+            if watermark is not None and key <= watermark:
+                # Forgotten files are still listed; only report ones that just arrived
+                if previous_poll is not None and stat.st_ctime_ns >= previous_poll:
+                    print(f"Skipping {image_path}: modified before the last "
+                          f"{history} files read")
+                continue
+            if now - stat.st_mtime_ns / 1e9 < settle:
+                continue
+            pending.append((key, image_path))
+        previous_poll = poll_started
+
+        for key, image_path in sorted(pending):
+            img = read_image(image_path, reduction)
+            seen[key] = None
+            if len(seen) > history:
+                forgotten, _ = seen.popitem(last=False)
+                watermark = forgotten if watermark is None else max(watermark, forgotten)
+            if img is not None:
+                yield key[1], img
+            else:
+                print(f"Failed to load: {image_path}")
+        if pending:
+            last_new = time.monotonic()
+        elif idle_timeout is not None and time.monotonic() - last_new >= idle_timeout:
+            return
+        else:
+            time.sleep(poll_interval)
+
+def iter_video_frames(source, frame_step=1, reduction=1):
+    """
+    Yield (name, frame) pairs from a cv2.VideoCapture source: a video file,
+    a stream URL or a camera index. Every `frame_step`-th frame is kept and
+    shrunk by `reduction`; names are the frame index and position in ms.
+    """
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video source: {source}")
+    try:
+        index = 0
+        while True:
+            if index % frame_step:
+                # Skip without decoding
+                if not capture.grab():
+                    return
+                index += 1
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                return
+            position = capture.get(cv2.CAP_PROP_POS_MSEC)
+            if reduction > 1:
+                frame = cv2.resize(frame, (frame.shape[1] // reduction, frame.shape[0] // reduction),
+                                   interpolation=cv2.INTER_AREA)
+            yield f"frame_{index:06d}_{int(position)}ms", frame
+            index += 1
+    finally:
+        capture.release()
+
+@timed('load_images_from_folder')
+def load_images_from_folder(folder_path, **stream_options):
+    """Load all images from the specified folder."""
     images = []
     filenames = []
 
-    for image_path in sorted(image_files):
-        img = cv2.imread(image_path)
-        if img is not None:
-            images.append(img)
-            filenames.append(os.path.basename(image_path))
-            print(f"Loaded: {os.path.basename(image_path)}")
-        else:
-            print(f"Failed to load: {image_path}")
+    for filename, img in iter_images_from_folder(folder_path, **stream_options):
+        images.append(img)
+        filenames.append(filename)
+        print(f"Loaded: {filename}")
 
-    return images, filenames
\ No newline at end of file
+    return images, filenames
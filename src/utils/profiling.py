@@ -0,0 +1,169 @@
+import cProfile
+import functools
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Shared no-op context returned by timers while profiling is disabled
+_NULL_TIMER = nullcontext()
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB, or None if unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class _Timer:
+    """Context manager recording one timed interval."""
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._record(self.name, time.perf_counter() - self.start)
+        return False
+
+class Profiler:
+    """
+    Lightweight stage timers and counters.
+
+    While disabled, timer() returns a shared no-op context and timed()
+    wrappers only check a flag, so instrumentation can stay in hot paths.
+    Timings from worker processes are not collected.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._cprofile = None
+        self.reset()
+
+    def reset(self):
+        """Clear all recorded timings and counters."""
+        self.stages = defaultdict(lambda: [0, 0.0, float('inf'), 0.0])  # calls, total, min, max
+        self.counters = defaultdict(int)
+        self.started = time.perf_counter()
+
+    def enable(self, cprofile=False):
+        """Start recording, optionally under cProfile as well."""
+        self.reset()
+        self.enabled = True
+        if cprofile:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def disable(self):
+        """Stop recording; collected data is kept until reset()."""
+        self.enabled = False
+        if self._cprofile is not None:
+            self._cprofile.disable()
+
+    def timer(self, *name):
+        """Context manager timing a stage; name parts are joined with dots."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, '.'.join(str(part) for part in name))
+
+    def timed(self, name=None):
+        """Decorator timing every call of a function."""
+        def decorator(func):
+            stage = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._record(stage, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def count(self, name, n=1):
+        """Increment a counter, e.g. frames or candidate contours."""
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += n
+
+    def _record(self, name, elapsed):
+        with self._lock:
+            stage = self.stages[name]
+            stage[0] += 1
+            stage[1] += elapsed
+            stage[2] = min(stage[2], elapsed)
+            stage[3] = max(stage[3], elapsed)
+
+    def report(self):
+        """Return wall time, per-stage timings, counters, frames per second and peak RSS."""
+        wall_time = time.perf_counter() - self.started
+        frames = self.counters.get('frames', 0)
+        with self._lock:
+            stages = {
+                name: {
+                    'calls': calls,
+                    'total_s': total,
+                    'mean_s': total / calls,
+                    'min_s': low,
+                    'max_s': high,
+                }
+                for name, (calls, total, low, high) in sorted(self.stages.items())
+            }
+            counters = dict(self.counters)
+        return {
+            'wall_time_s': wall_time,
+            'frames_per_second': frames / wall_time if frames and wall_time > 0 else None,
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': stages,
+            'counters': counters,
+        }
+
+    def export_json(self, path):
+        """Write report() as JSON."""
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def dump_cprofile(self, path):
+        """Write cProfile stats (readable by pstats, snakeviz or flameprof)."""
+        if self._cprofile is None:
+            return False
+        self._cprofile.dump_stats(path)
+        return True
+
+    def format_report(self):
+        """Human-readable summary of report()."""
+        report = self.report()
+        lines = [f"Wall time: {report['wall_time_s']:.2f}s"]
+        if report['frames_per_second'] is not None:
+            lines.append(f"Frames per second: {report['frames_per_second']:.2f}")
+        if report['peak_rss_mb'] is not None:
+            lines.append(f"Peak RSS: {report['peak_rss_mb']:.1f} MiB")
+        for name, stage in report['stages'].items():
+            lines.append(f"  {name}: {stage['total_s']:.3f}s total, "
+                         f"{stage['calls']} calls, {stage['mean_s'] * 1000:.2f}ms mean")
+        for name, value in report['counters'].items():
+            lines.append(f"  {name}: {value}")
+        return '\n'.join(lines)
+
+# Process-wide profiler used by the pipeline's instrumentation
+PROFILER = Profiler()
+timer = PROFILER.timer
+timed = PROFILER.timed
+count = PROFILER.count
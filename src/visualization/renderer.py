@@ -0,0 +1,122 @@
+import os
+import cv2
+import numpy as np
+from detection.parallel import imap_frames
+
+GT_COLOR = (0, 255, 0)          # Green (BGR)
+DETECTION_COLOR = (0, 0, 255)   # Red (BGR)
+RENDER_MODES = ('matplotlib', 'composite')
+
+def draw_ground_truth(image, ground_truth_coords):
+    """Return a copy of the image with ground truth points drawn as green dots."""
+    img_with_gt = image.copy()
+    for x, y in ground_truth_coords:
+        cv2.circle(img_with_gt, (int(x), int(y)), 5, GT_COLOR, -1)  # Green dots
+        cv2.circle(img_with_gt, (int(x), int(y)), 7, GT_COLOR, 2)   # Green circles
+    return img_with_gt
+
+def blend_detections(base, image, mask, alpha):
+    """
+    Blend `base` with a copy of `image` whose detected pixels are red.
+    Equivalent to addWeighted(base, 1 - alpha, overlay, alpha), but only the
+    detected pixels are recomputed when base is image.
+    """
+    selected = mask > 0
+    if base is image:
+        blended = image.copy()
+    else:
+        blended = cv2.addWeighted(base, 1 - alpha, image, alpha, 0)
+    red = np.array(DETECTION_COLOR, dtype=np.float32)
+    blended[selected] = np.clip(
+        base[selected] * (1 - alpha) + red * alpha + 0.5, 0, 255
+    ).astype(np.uint8)
+    return blended
+
+def build_panels(image, background, mask, count, ground_truth_coords, alpha=0.3):
+    """Return the six (title, image) analysis panels; color images are BGR."""
+    if ground_truth_coords is None:
+        ground_truth_coords = np.empty((0, 2))
+    img_with_gt = draw_ground_truth(image, ground_truth_coords)
+    return [
+        ('Original Image', image),
+        ('Background Model', background),
+        ('Detection Mask', mask),
+        (f'Ground Truth ({len(ground_truth_coords)} people)', img_with_gt),
+        (f'Detection Result ({count} people)', blend_detections(image, image, mask, alpha)),
+        ('Combined (Green: Ground Truth, Red: Detections)',
+         blend_detections(img_with_gt, image, mask, alpha)),
+    ]
+
+def render_figure(panels, filename, figure_size=(20, 10)):
+    """Lay the panels out in a 2x3 matplotlib figure without touching pyplot state."""
+    # Imported here so runs that never render figures do not load matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=tuple(figure_size))
+    FigureCanvasAgg(fig)
+    for position, (title, panel) in enumerate(panels, start=1):
+        ax = fig.add_subplot(2, 3, position)
+        if panel.ndim == 2:
+            ax.imshow(panel, cmap='gray')
+        else:
+            ax.imshow(cv2.cvtColor(panel, cv2.COLOR_BGR2RGB))
+        ax.set_title(title)
+        ax.axis('off')
+    fig.suptitle(f'People Detection Analysis - {filename}', fontsize=16)
+    fig.tight_layout()
+    return fig
+
+def render_composite(panels, filename, panel_width=640):
+    """Tile the panels into a single BGR image with OpenCV, without matplotlib."""
+    title_height = 32
+    tiles = []
+    for title, panel in panels:
+        if panel.ndim == 2:
+            panel = cv2.cvtColor(panel, cv2.COLOR_GRAY2BGR)
+        h, w = panel.shape[:2]
+        tile = cv2.resize(panel, (panel_width, int(round(h * panel_width / w))),
+                          interpolation=cv2.INTER_AREA)
+        header = np.full((title_height, panel_width, 3), 255, dtype=np.uint8)
+        cv2.putText(header, title, (8, 22), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 0, 0), 1,
+                    cv2.LINE_AA)
+        tiles.append(np.vstack((header, tile)))
+    grid = np.vstack((np.hstack(tiles[:3]), np.hstack(tiles[3:])))
+    banner = np.full((40, grid.shape[1], 3), 255, dtype=np.uint8)
+    cv2.putText(banner, f'People Detection Analysis - {filename}', (8, 28),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2, cv2.LINE_AA)
+    return np.vstack((banner, grid))
+
+def render_frame(item, background, presentation_folder, mode='matplotlib', dpi=300,
+                 figure_size=(20, 10), overlay_alpha=0.3, panel_width=640):
+    """
+    Render and save the analysis visual for one frame.
+    `item` is (image, mask, count, filename, ground_truth_coords). Returns the
+    path of the written PNG.
+    """
+    image, mask, count, filename, ground_truth_coords = item
+    panels = build_panels(image, background, mask, count, ground_truth_coords, overlay_alpha)
+    base_name = os.path.splitext(filename)[0]
+    output_path = os.path.join(presentation_folder, f'analysis_{base_name}.png')
+
+    if mode == 'composite':
+        cv2.imwrite(output_path, render_composite(panels, filename, panel_width))
+    elif mode == 'matplotlib':
+        fig = render_figure(panels, filename, figure_size)
+        fig.savefig(output_path, dpi=dpi, bbox_inches='tight')
+    else:
+        raise ValueError(f"Unknown render mode: {mode}")
+    return output_path
+
+def render_frames(items, background, presentation_folder, workers=1, backend='process',
+                  **render_options):
+    """
+    Render frames as they arrive, optionally in parallel worker processes.
+    `items` may be a lazy iterator of (image, mask, count, filename,
+    ground_truth_coords) tuples; written paths are yielded in input order.
+    The background is shared with workers once rather than per frame.
+    """
+    for _, output_path in imap_frames(render_frame, items, background, workers=workers,
+                                      backend=backend, ordered=True,
+                                      func_kwargs={'presentation_folder': presentation_folder,
+                                                   **render_options}):
+        yield output_path
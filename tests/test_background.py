@@ -0,0 +1,67 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from detection.background import _block_mode  # noqa: E402
+
+
+def reference_block_mode(channel_data, block_size=10, bins=50):
+    """The per-block np.histogram loop _block_mode replaced."""
+    h, w = channel_data.shape[1:]
+    mode = np.zeros((h, w), dtype=np.float32)
+    for i in range(0, h, block_size):
+        for j in range(0, w, block_size):
+            block = channel_data[:, i:min(i+block_size, h), j:min(j+block_size, w)]
+            hist, bins_edges = np.histogram(block.ravel(), bins=bins)
+            mode_idx = np.argmax(hist)
+            mode_value = (bins_edges[mode_idx] + bins_edges[mode_idx + 1]) / 2
+            mode[i:min(i+block_size, h), j:min(j+block_size, w)] = mode_value
+    return mode
+
+
+def bin_widths(channel_data, block_size, bins):
+    """Per-pixel histogram bin width of the block each pixel belongs to."""
+    h, w = channel_data.shape[1:]
+    widths = np.zeros((h, w), dtype=np.float64)
+    for i in range(0, h, block_size):
+        for j in range(0, w, block_size):
+            block = channel_data[:, i:i+block_size, j:j+block_size].astype(np.float64)
+            span = block.max() - block.min()
+            widths[i:i+block_size, j:j+block_size] = (span if span else 1.0) / bins
+    return widths
+
+
+@pytest.mark.parametrize('shape, block_size, bins', [
+    ((5, 40, 60), 10, 50),   # Whole blocks
+    ((7, 37, 53), 10, 50),   # Ragged bottom and right edge blocks
+    ((3, 23, 29), 8, 16),
+    ((1, 9, 14), 4, 7),
+])
+def test_block_mode_matches_histogram_loop(shape, block_size, bins):
+    rng = np.random.default_rng(sum(shape) + block_size)
+    data = rng.integers(0, 256, size=shape, dtype=np.uint8)
+    # Skewed blocks so every block has a clear mode
+    data[:, ::2] //= 3
+
+    result = _block_mode(data, block_size, bins)
+    expected = reference_block_mode(data, block_size, bins)
+
+    assert result.shape == expected.shape
+    assert np.all(np.abs(result - expected) <= bin_widths(data, block_size, bins) + 1e-4)
+
+
+def test_block_mode_flat_blocks():
+    # A constant block takes np.histogram's widened (value - 0.5, value + 0.5) range
+    data = np.full((4, 20, 25), 117, dtype=np.uint8)
+    data[:, 10:, :] = 3
+    data[:, 10:, 20:] = 200  # Ragged flat edge block
+
+    result = _block_mode(data, 10, 50)
+    expected = reference_block_mode(data, 10, 50)
+
+    np.testing.assert_allclose(result, expected, atol=1.0 / 50 + 1e-4)
+    np.testing.assert_allclose(result[:10], 117, atol=1.0 / 50 + 1e-4)